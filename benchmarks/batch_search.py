@@ -0,0 +1,59 @@
+"""Compare many /api/memes/search requests against one /api/memes/search/batch request
+
+Runs both through Flask's test client on a synthetic catalog, so it measures
+request handling and scoring but not the network.
+
+Usage: python benchmarks/batch_search.py [meme_count] [query_count]
+"""
+import json
+import random
+import sys
+import time
+
+from pathlib import Path
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_memory import WORDS, make_resources
+from search_latency import zipf_vocabulary
+from meme.database import gateway
+from meme.database.catalog import Catalog
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    vocabulary, weights = zipf_vocabulary()
+    catalog = Catalog.from_resources(json.loads(
+        make_resources(count, vocabulary=vocabulary, weights=weights)
+    ))
+    gateway.get_catalog = lambda: catalog
+
+    from meme.app import app
+    client = app.test_client()
+
+    # Keywords a chat message might resolve: mostly long-tail tags, a few with typos
+    rng = random.Random(1)
+    queries = [rng.choice(vocabulary[1000:]) for _ in range(query_count)]
+    queries[::5] = [word[:-1] + 'x' for word in rng.sample(WORDS, len(queries[::5]))]
+
+    start = time.perf_counter()
+    single = [client.get(f"/api/memes/search?q={quote(query)}&threshold=75").get_json() for query in queries]
+    single_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    batch = client.post(
+        '/api/memes/search/batch',
+        json=[{'q': query, 'threshold': 75} for query in queries]
+    ).get_json()
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    assert [r['total_matches'] for r in single] == [r['total_matches'] for r in batch['results']]
+
+    print(f"memes: {count}, queries: {query_count}")
+    print(f"individual requests: {single_ms:8.1f} ms ({query_count * 1000 / single_ms:7.1f} queries/s)")
+    print(f"one batch request:   {batch_ms:8.1f} ms ({query_count * 1000 / batch_ms:7.1f} queries/s)")
+
+if __name__ == '__main__':
+    main()
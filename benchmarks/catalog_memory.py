@@ -0,0 +1,122 @@
+"""Compare memory and iteration cost of raw Cloudinary dicts vs the compact Catalog
+
+Usage: python benchmarks/catalog_memory.py [meme_count]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from meme.database.catalog import Catalog
+
+WORDS = [
+    'angry', 'cat', 'keyboard', 'dog', 'run', 'running', 'stare', 'staring', 'surprised',
+    'pikachu', 'drake', 'distracted', 'boyfriend', 'galaxy', 'brain', 'doge', 'fine',
+    'fire', 'this', 'is', 'success', 'kid', 'disaster', 'girl', 'stonks', 'think'
+]
+
+def make_resources(count, seed=0, vocabulary=WORDS, weights=None):
+    """Generate listings shaped like cloudinary.api.resources(tags=True, context=True)"""
+    rng = random.Random(seed)
+    resources = []
+    for i in range(count):
+        words = rng.choices(vocabulary, weights, k=3) if weights else rng.sample(vocabulary, 3)
+        name = f"{'-'.join(words)}-{i}"
+        version = 1700000000 + i
+        file_format = rng.choice(['jpg', 'png', 'gif'])
+        url = f"res.cloudinary.com/demo/image/upload/v{version}/memes/{name}.{file_format}"
+        resources.append({
+            'asset_id': f"{rng.getrandbits(128):032x}",
+            'public_id': f"memes/{name}",
+            'format': file_format,
+            'version': version,
+            'resource_type': 'image',
+            'type': 'upload',
+            'created_at': '2024-01-01T00:00:00Z',
+            'bytes': rng.randint(10000, 900000),
+            'width': rng.randint(200, 1200),
+            'height': rng.randint(200, 1200),
+            'folder': 'memes',
+            'url': f"http://{url}",
+            'secure_url': f"https://{url}",
+            'tags': sorted(set(words)),
+            'context': {'custom': {'caption': name, 'language': rng.choice(['en', 'en', 'zh'])}}
+        })
+    # Round-trip through JSON so strings are not shared, as with a real response
+    return json.dumps(resources)
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    value = build(*args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return value, used
+
+def measure_peak(build):
+    """Peak traced memory while building, including transient allocations"""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return value, peak
+
+def paged(payloads):
+    """Decode one page at a time, as gateway._iter_resources hands pages over"""
+    for payload in payloads:
+        yield from json.loads(payload)
+
+def iterate_raw(resources):
+    total = 0
+    for resource in resources:
+        name = resource['public_id'].replace('memes/', '')
+        context = resource.get('context', {}).get('custom', {})
+        total += len(resource.get('tags', [])) + len(context.get('caption', name))
+    return total
+
+def iterate_catalog(catalog):
+    total = 0
+    for index in range(len(catalog)):
+        total += len(catalog.tag_ids_of(index)) + len(catalog.title(index))
+    return total
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = make_resources(count)
+
+    resources, raw_bytes = measure(json.loads, payload)
+    catalog, compact_bytes = measure(Catalog.from_resources, resources)
+    assert [catalog.url(i) for i in range(len(catalog))] == [r['secure_url'] for r in resources]
+
+    print(f"memes:               {count}")
+    print(f"raw dicts:           {raw_bytes / count:8.1f} bytes/meme")
+    print(f"compact catalog:     {compact_bytes / count:8.1f} bytes/meme "
+          f"({raw_bytes / compact_bytes:.1f}x smaller)")
+
+    print(f"iterate raw dicts:   {timed(iterate_raw, resources):8.1f} ms")
+    print(f"iterate catalog:     {timed(iterate_catalog, catalog):8.1f} ms")
+
+    # Peak while refreshing: the whole listing decoded first, versus built page by page
+    pages = [json.dumps(resources[start:start + 500]) for start in range(0, count, 500)]
+    del resources, catalog
+    _, listing_peak = measure_peak(lambda: Catalog.from_resources(json.loads(payload)))
+    _, paged_peak = measure_peak(lambda: Catalog.from_resources(paged(pages)))
+    print(f"peak, whole listing: {listing_peak / count:8.1f} bytes/meme")
+    print(f"peak, page by page:  {paged_peak / count:8.1f} bytes/meme")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure CLI startup time for lightweight commands with `python -X importtime`
+
+Reports the median wall time per command and the slowest top-level imports,
+and exits non-zero when a command exceeds the startup budget.
+
+Usage: python benchmarks/cli_startup.py [runs] [budget_ms]
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MAIN = ROOT / 'main.py'
+
+def first_meme_name():
+    with open(ROOT / 'meme' / 'static' / 'meme_metadata.json', 'r') as f:
+        return next(iter(json.load(f)['meme_images']), 'missing')
+
+def run(args):
+    """Run the CLI once, returning wall time in ms and {module: cumulative us} for top-level imports"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', str(MAIN), *args],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):  # top-level import (nested ones are indented)
+            imports[name.strip()] = int(cumulative)
+    return elapsed_ms, imports
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    commands = [['--help'], ['meta', first_meme_name()], ['search', '--help']]
+    over_budget = False
+    for args in commands:
+        timings = []
+        for _ in range(runs):
+            elapsed_ms, imports = run(args)
+            timings.append(elapsed_ms)
+
+        median_ms = statistics.median(timings)
+        over_budget |= median_ms > budget_ms
+        status = 'ok' if median_ms <= budget_ms else 'OVER BUDGET'
+        print(f"meme {' '.join(args):32} median {median_ms:7.1f} ms  ({status}, budget {budget_ms:.0f} ms)")
+
+        slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:5]
+        for name, cumulative in slowest:
+            print(f"    {cumulative / 1000:7.1f} ms  {name}")
+
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measure search and suggest index build time and query latency on a synthetic catalog
+
+Usage: python benchmarks/search_latency.py [meme_count] [--worst-case]
+"""
+import json
+import random
+import statistics
+import string
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_memory import WORDS, make_resources
+from meme.database.catalog import Catalog
+from meme.database.search_index import SearchIndex, get_search_index
+from meme.database.suggest_index import SuggestIndex
+
+QUERIES = ['angry cat keyboard', 'pikachu', 'surprised pikachu', 'drake', 'distracted boyfriend',
+           'galaxy brain', 'this is fine', 'stonks', 'angyr cta', 'success kid']
+PREFIXES = ['a', 'an', 'ang', 'angry', 'angry-', 'angry-cat', 'p', 'pik', 'q', 'qu', 'zz']
+
+def zipf_vocabulary(size=5000):
+    """Real tag vocabularies are large with a long tail; the meme words stay the most common"""
+    rng = random.Random(size)
+    vocabulary = list(WORDS)
+    seen = set(vocabulary)
+    while len(vocabulary) < size:
+        word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary, [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    count = int(args[0]) if args else 100000
+    worst_case = '--worst-case' in sys.argv
+    if worst_case:
+        # Every meme drawn from 26 words: each term matches ~10% of the catalog
+        payload = make_resources(count)
+    else:
+        vocabulary, weights = zipf_vocabulary()
+        payload = make_resources(count, vocabulary=vocabulary, weights=weights)
+    catalog = Catalog.from_resources(json.loads(payload))
+
+    start = time.perf_counter()
+    search_index = SearchIndex.from_catalog(catalog)
+    print(f"memes:        {count}")
+    print(f"index build:  {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            search_index.search(query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{query!r:24} median {statistics.median(timings):6.2f} ms  max {max(timings):6.2f} ms")
+
+    # A TTL refresh yields a new Catalog object; unchanged content must not trigger a rebuild
+    get_search_index(catalog)
+    refreshed = Catalog.from_resources(json.loads(payload))
+    start = time.perf_counter()
+    _, reused = get_search_index(refreshed)
+    print(f"unchanged refresh: {(time.perf_counter() - start) * 1000:6.1f} ms (index reused: {reused is get_search_index(catalog)[1]})")
+
+    start = time.perf_counter()
+    suggest_index = SuggestIndex.from_catalog(catalog)
+    print(f"suggest build: {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+    for prefix in PREFIXES:
+        timings = []
+        for _ in range(50):
+            start = time.perf_counter()
+            suggest_index.suggest(prefix, limit=10)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"suggest {prefix!r:16} median {statistics.median(timings):6.3f} ms  max {max(timings):6.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,12 @@ import shutil
 
 import click
 
-from fuzzywuzzy import fuzz
 from rich.console import Console
 from rich.table import Table
 
-from meme.database.cloudinary import (
-    init_cloudinary,
-    upload_image,
-    delete_image,
-    list_images,
-    search_images,
-    update_image_metadata
-)
+# Only lightweight modules are imported here. Cloudinary, Flask, fuzzywuzzy,
+# spaCy and Pillow are imported inside the commands that use them, so that
+# `meme --help` and local metadata commands start quickly.
 from meme.database.metadata import load_metadata, save_metadata
 from meme.utils.cli import (
     validate_image_name,
@@ -24,7 +18,6 @@ from meme.utils.cli import (
     validate_delete_args
 )
 from meme.utils.paths import get_paths
-from meme.utils.generate_metadata import generate_metadata as gen_metadata
 
 console = Console()
 
@@ -37,9 +30,16 @@ def cli_group():
 @click.argument('image_name', required=False)
 @click.option('--pending', is_flag=True, help='Upload pending images only')
 @click.option('--all', 'upload_all', is_flag=True, help='Re-upload all images')
-@click.option('--dryrun', is_flag=True, help='Preview what would happen without making changes')
-def upload(image_name, pending, upload_all, dryrun):
+@click.option('--dryrun', is_flag=True, help='Preview what would happen without uploading (--optimize still writes copies to _cache/optimized)')
+@click.option('--optimize', is_flag=True, help='Recompress images into _cache/optimized before uploading')
+@click.option('--max-dimension', type=int, help='With --optimize, downscale images larger than this many pixels')
+@click.option('--lossy', is_flag=True, help='With --optimize, allow lossy JPEG recompression and PNG quantization')
+@click.option('--quality', default=85, help='With --lossy, JPEG quality (1-95)', type=int)
+@click.option('--workers', type=int, help='With --optimize, number of worker processes (default: CPU count)')
+def upload(image_name, pending, upload_all, dryrun, optimize, max_dimension, lossy, quality, workers):
     """Upload images to Cloudinary"""
+    from meme.database.cloudinary import init_cloudinary, upload_image
+
     if not init_cloudinary():
         return
 
@@ -68,16 +68,18 @@ def upload(image_name, pending, upload_all, dryrun):
             console.print(f"[red]Error: Image {image_name} not found")
             return
 
+        optimized = optimize_for_upload([image_file], max_dimension, lossy, quality, workers) if optimize else {}
+
         # Upload single image
         console.print(f"Processing [cyan]{image_name}[/cyan]")
         if dryrun:
-            console.print(f"[yellow]Would upload: {image_file}")
+            console.print(f"[yellow]Would upload: {optimized.get(image_name, {}).get('path', image_file)}")
             if image_file.parent == app_paths['pending']:
                 console.print(f"[yellow]Would move to: {app_paths['uploaded'] / image_file.name}")
         else:
             meme_data = meta['meme_images'].get(image_name, {})
             if upload_image(
-                image_file,
+                optimized.get(image_name, {}).get('path', image_file),
                 image_name,
                 tags=meme_data.get('tags', []),
                 title=meme_data.get('title', image_name),
@@ -86,6 +88,8 @@ def upload(image_name, pending, upload_all, dryrun):
                 console.print(f"[green]>> Successfully uploaded {image_name}")
                 if image_file.parent == app_paths['pending']:
                     shutil.move(str(image_file), str(app_paths['uploaded'] / image_file.name))
+                if record_optimization(meta, optimized.get(image_name)):
+                    save_metadata(meta)
 
     elif pending or upload_all:
         source_dir = app_paths['pending'] if pending else app_paths['uploaded']
@@ -96,16 +100,19 @@ def upload(image_name, pending, upload_all, dryrun):
             console.print("[yellow]No images found to process")
             return
 
+        optimized = optimize_for_upload(images, max_dimension, lossy, quality, workers) if optimize else {}
+
+        recorded = False
         for img in images:
             console.print(f"Processing [cyan]{img.stem}[/cyan]")
             if dryrun:
-                console.print(f"[yellow]Would upload: {img}")
+                console.print(f"[yellow]Would upload: {optimized.get(img.stem, {}).get('path', img)}")
                 if pending:
                     console.print(f"[yellow]Would move to: {app_paths['uploaded'] / img.name}")
             else:
                 meme_data = meta['meme_images'].get(img.stem, {})
                 if upload_image(
-                    img,
+                    optimized.get(img.stem, {}).get('path', img),
                     img.stem,
                     tags=meme_data.get('tags', []),
                     title=meme_data.get('title', img.stem),
@@ -114,6 +121,74 @@ def upload(image_name, pending, upload_all, dryrun):
                     if pending:
                         shutil.move(str(img), str(app_paths['uploaded'] / img.name))
                     console.print(f"[green]>> Successfully uploaded {img.stem}")
+                    recorded |= record_optimization(meta, optimized.get(img.stem))
+
+        if recorded:
+            save_metadata(meta)
+
+def optimize_for_upload(image_files, max_dimension, lossy, quality, workers):
+    """Optimize images before upload and report the bytes saved, keyed by meme name"""
+    from meme.utils.optimize import optimize_images
+
+    console.print(f"Optimizing [cyan]{len(image_files)}[/cyan] images...")
+    results = optimize_images(
+        image_files,
+        max_dimension=max_dimension,
+        lossy=lossy,
+        quality=max(1, min(quality, 95)),
+        workers=workers
+    )
+
+    table = Table(title="Image Optimization")
+    table.add_column("Image", style="cyan")
+    table.add_column("Original", style="blue")
+    table.add_column("Optimized", style="green")
+    table.add_column("Saved", style="yellow")
+    table.add_column("Dimensions", style="magenta")
+
+    original_total = 0
+    optimized_total = 0
+    for result in results:
+        if result['error']:
+            table.add_row(result['name'], f"{result['original_bytes'] / 1024:.1f} KB", "[red]failed", "-", result['error'])
+            continue
+        original_total += result['original_bytes']
+        optimized_total += result['optimized_bytes']
+        saved = result['original_bytes'] - result['optimized_bytes']
+        table.add_row(
+            result['name'],
+            f"{result['original_bytes'] / 1024:.1f} KB",
+            f"{result['optimized_bytes'] / 1024:.1f} KB",
+            f"{saved / 1024:.1f} KB ({saved * 100 / max(result['original_bytes'], 1):.0f}%)",
+            "{}x{} -> {}x{}".format(*result['original_size'], *result['optimized_size'])
+        )
+
+    console.print(table)
+    saved_total = original_total - optimized_total
+    console.print(
+        f"[green]Total saved: {saved_total / 1024:.1f} KB "
+        f"({saved_total * 100 / max(original_total, 1):.0f}% of {original_total / 1024:.1f} KB)"
+    )
+    return {result['name']: result for result in results if not result['error']}
+
+def record_optimization(meta, result):
+    """Record original and optimized dimensions of an uploaded image in the metadata"""
+    if not result or result['name'] not in meta['meme_images']:
+        return False
+
+    meta['meme_images'][result['name']]['optimization'] = {
+        'original': {
+            'width': result['original_size'][0],
+            'height': result['original_size'][1],
+            'bytes': result['original_bytes']
+        },
+        'optimized': {
+            'width': result['optimized_size'][0],
+            'height': result['optimized_size'][1],
+            'bytes': result['optimized_bytes']
+        }
+    }
+    return True
 
 @cli_group.command()
 @click.argument('image_name', required=False)
@@ -121,6 +196,8 @@ def upload(image_name, pending, upload_all, dryrun):
 @click.option('--confirm', is_flag=True, help='Actually execute the changes (default is dry-run)')
 def delete(image_name, delete_all, confirm):
     """Delete images from Cloudinary"""
+    from meme.database.cloudinary import init_cloudinary, delete_image
+
     if not init_cloudinary():
         return
 
@@ -158,6 +235,8 @@ def delete(image_name, delete_all, confirm):
 @click.option('--details', is_flag=True, help='Show detailed information')
 def list(details):
     """List all memes in Cloudinary"""
+    from meme.database.cloudinary import init_cloudinary, list_images
+
     if not init_cloudinary():
         return
 
@@ -184,51 +263,57 @@ def list(details):
 @cli_group.command()
 @click.argument('keyword', required=True)
 @click.option('--threshold', default=60, help='Match threshold (0-100)', type=int)
-def search(keyword, threshold):
-    """Search memes in Cloudinary by keyword"""
-    if not init_cloudinary():
-        return
-    
-    resources = search_images(keyword, threshold)
-    if not resources:
+@click.option('--local', is_flag=True, help='Search local metadata without network access')
+@click.option('--urls', is_flag=True, help='With local search, look up URLs in Cloudinary')
+def search(keyword, threshold, local, urls):
+    """Search memes by keyword"""
+    if not local:
+        from meme.database.gateway import is_reachable
+
+        if not is_reachable():
+            console.print("[yellow]Cloudinary unreachable, searching local metadata")
+            local = True
+
+    if local:
+        from meme.database.local_index import search_local
+
+        results = search_local(keyword, threshold)
+        if results and urls:
+            from meme.database.cloudinary import init_cloudinary, lookup_urls
+
+            if init_cloudinary():
+                found_urls = lookup_urls(result['name'] for result in results)
+                for result in results:
+                    result['url'] = found_urls.get(result['name'], 'N/A')
+    else:
+        from meme.database.cloudinary import init_cloudinary, search_images
+
+        if not init_cloudinary():
+            return
+        results = search_images(keyword, threshold)
+
+    if not results:
         console.print(f"[yellow]No memes found matching '{keyword}'")
         return
 
+    show_urls = not local or urls
     table = Table(title=f"Search Results for '{keyword}'")
     table.add_column("Name", style="cyan")
     table.add_column("Match Score", style="green")
     table.add_column("Tags", style="yellow")
-    table.add_column("URL", style="blue")
-    
-    results = []
-    for resource in resources:
-        name = resource['public_id'].replace('memes/', '')
-        tags = resource.get('tags', [])
-        
-        score = max([fuzz.partial_ratio(keyword.lower(), name.lower())] +
-                   [fuzz.partial_ratio(keyword.lower(), tag.lower()) for tag in tags])
-        
-        if score >= threshold:
-            results.append({
-                'name': name,
-                'score': score,
-                'tags': tags,
-                'url': resource['secure_url']
-            })
-    
-    results.sort(key=lambda x: x['score'], reverse=True)
+    if show_urls:
+        table.add_column("URL", style="blue")
     
-    if results:
-        for result in results:
-            table.add_row(
-                result['name'],
-                f"{result['score']}%",
-                ", ".join(result['tags']),
-                result['url']
-            )
-        console.print(table)
-    else:
-        console.print(f"[yellow]No memes found matching '{keyword}'")
+    for result in results:
+        row = [
+            result['name'],
+            f"{result['score']}%",
+            ", ".join(result['tags'])
+        ]
+        if show_urls:
+            row.append(result.get('url', 'N/A'))
+        table.add_row(*row)
+    console.print(table)
 
 @cli_group.command(name='meta')
 @click.argument('name', required=False)
@@ -239,9 +324,6 @@ def search(keyword, threshold):
 @click.option('--confirm', is_flag=True, help='Actually execute the changes (default is dry-run)')
 def manage_metadata(name, add, push, generate, overwrite, confirm):
     """Manage tags and metadata for memes"""
-    if not init_cloudinary():
-        return
-
     try:
         if generate:
             if not confirm:
@@ -260,6 +342,8 @@ def manage_metadata(name, add, push, generate, overwrite, confirm):
             console.print("[cyan]Analyzing images...")
             
             if confirm:
+                from meme.utils.generate_metadata import generate_metadata as gen_metadata
+
                 image_count = gen_metadata()
                 if image_count == 0:
                     console.print("[yellow]No images found in _images directories")
@@ -288,6 +372,11 @@ def manage_metadata(name, add, push, generate, overwrite, confirm):
             return
 
         if push:
+            from meme.database.cloudinary import init_cloudinary, list_images, update_image_metadata
+
+            if not init_cloudinary():
+                return
+
             resources = list_images(with_metadata=True)
             if not resources:
                 return
@@ -377,5 +466,62 @@ def manage_metadata(name, add, push, generate, overwrite, confirm):
     except Exception as e:
         console.print(f"[red]Error managing metadata: {str(e)}")
 
+@cli_group.command()
+@click.argument('profile_id', required=False)
+@click.option('--limit', default=20, help='Number of recent profiles to list', type=int)
+@click.option('--clear', is_flag=True, help='Delete all stored profiles')
+@click.option('--confirm', is_flag=True, help='Actually execute the changes (default is dry-run)')
+def profiles(profile_id, limit, clear, confirm):
+    """Inspect sampled request profiles"""
+    from meme.utils.profiling import list_profiles, load_profile, clear_profiles
+
+    if clear:
+        if not confirm:
+            show_dry_run_message()
+            console.print(f"[yellow]Would delete {len(list_profiles())} stored profiles")
+            show_confirmation_command("meme profiles --clear --confirm")
+        else:
+            console.print(f"[green]Deleted {clear_profiles()} stored profiles")
+        return
+
+    if profile_id:
+        record = load_profile(profile_id)
+        if not record:
+            console.print(f"[red]Error: Profile {profile_id} not found")
+            return
+
+        console.print(f"[cyan]{record['method']} {record['path']}[/cyan] -> {record['status']}")
+        console.print(f"[green]Total: {record['total_ms']:.1f} ms")
+        for name, ms in record['phases'].items():
+            console.print(f"  [yellow]{name}: {ms:.1f} ms")
+        if record.get('stats'):
+            console.print()
+            console.print(record['stats'], markup=False, highlight=False)
+        return
+
+    records = list_profiles(limit)
+    if not records:
+        console.print("[yellow]No request profiles recorded")
+        return
+
+    table = Table(title="Request Profiles")
+    table.add_column("ID", style="cyan")
+    table.add_column("Request", style="blue")
+    table.add_column("Status")
+    table.add_column("Total", style="green")
+    table.add_column("Phases", style="yellow")
+    table.add_column("Kind", style="magenta")
+
+    for record in records:
+        table.add_row(
+            record['id'],
+            f"{record['method']} {record['path']}",
+            str(record['status']),
+            f"{record['total_ms']:.1f} ms",
+            ", ".join(f"{name} {ms:.1f}" for name, ms in record['phases'].items()),
+            "profile" if record.get('profiled') else "slow"
+        )
+    console.print(table)
+
 if __name__ == '__main__':
     cli_group() 
\ No newline at end of file
@@ -2,122 +2,133 @@ from doctest import debug
 import json
 import os
 
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, send_file, url_for
 from flask_cors import CORS
 from dotenv import load_dotenv
-from fuzzywuzzy import fuzz
+
+from meme.database import gateway
+from meme.database.gateway import UpstreamError, UpstreamUnavailable
+from meme.database.image_cache import ImageNotFound, get_image
+from meme.database.fuzzy_search import score_tag, search_catalog
+from meme.database.metadata import metadata_lock
+from meme.database.search_index import get_search_index
+from meme.database.suggest_index import get_suggest_index
+from meme.utils import jobs
+from meme.utils.profiling import init_profiling, phase
 
 # Load environment variables
 load_dotenv()
 
-cloudinary_url = os.getenv('CLOUDINARY_URL')
-if cloudinary_url:
-    # Parse cloudinary URL
-    parts = cloudinary_url.replace('cloudinary://', '').split('@')
-    if len(parts) == 2:
-        credentials, cloud_name = parts
-        api_key, api_secret = credentials.split(':')
-        
-        cloudinary.config(
-            cloud_name=cloud_name,
-            api_key=api_key,
-            api_secret=api_secret
-        )
-else:
+if not gateway.configure():
     print("Warning: CLOUDINARY_URL not found in environment variables")
 
 app = Flask(__name__)
 CORS(app)
+init_profiling(app)
 
 STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+MAX_BATCH_QUERIES = 100
+IMAGE_MAX_AGE = 24 * 60 * 60
 
 @app.route('/api/memes', methods=['GET'])
 def get_memes():
     """Get all memes"""
     try:
-        # Get all resources from Cloudinary with tags and context
-        result = cloudinary.api.resources(
-            type="upload",
-            prefix="memes/",
-            max_results=500,
-            tags=True,
-            context=True
-        )
-        
-        if not result['resources']:
+        # Get the catalog of memes with tags and context
+        with phase('upstream'):
+            catalog = gateway.get_catalog()
+        
+        if not len(catalog):
             return jsonify({'memes': []})
 
-        memes = []
-        for resource in result['resources']:
-            name = resource['public_id'].replace('memes/', '')
-            context = resource.get('context', {}).get('custom', {})
-            
-            memes.append({
-                'name': name,
-                'url': resource['secure_url'],
-                'width': resource.get('width', 0),
-                'height': resource.get('height', 0),
-                'tags': resource.get('tags', []),
-                'language': context.get('language', 'en'),
-                'title': context.get('caption', name)
-            })
+        with phase('build'):
+            memes = [catalog.meme(index) for index in range(len(catalog))]
         
-        return jsonify({'memes': memes})
+        with phase('serialize'):
+            return jsonify({'memes': memes})
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/memes/<filename>', methods=['POST'])
-def upload_meme(filename):
-    """Upload a new meme"""
-    try:
-        # Get properties from metadata if they exist
+def process_upload(payload):
+    """Upload a queued meme to Cloudinary and record it in meme_metadata.json"""
+    filename = payload['name']
+    result = gateway.upload(payload['attachment'], filename, tags=['meme'])
+
+    # Workers in this and other processes run concurrently, so serialize the metadata read-modify-write
+    with metadata_lock():
         with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'r') as f:
             metadata = json.load(f)
-        
+
         meme_properties = metadata['meme_images'].get(filename, {})
-        
-        # Get the file from request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if not file.filename:
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            file,
-            public_id=f"memes/{filename}",
-            tags=['meme']
-        )
-        
+
         # Update meme_metadata.json if not already present
         if filename not in metadata['meme_images']:
             metadata['meme_images'][filename] = {
-                'file_name': file.filename,
+                'file_name': payload['file_name'],
                 'width': result['width'],
                 'height': result['height'],
                 'keywords': meme_properties.get('keywords', []),
                 'language': meme_properties.get('language', 'en'),
                 'properties': {
                     'type': 'image',
-                    'format': file.filename.split('.')[-1],
+                    'format': payload['file_name'].split('.')[-1],
                     'dimensions': f"{result['width']}x{result['height']}"
                 }
             }
-            
+
             with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'w') as f:
                 json.dump(metadata, f, indent=4)
+
+    return {
+        'url': result['secure_url'],
+        'public_id': result['public_id']
+    }
+
+# While the breaker is open or the rate limit is spent, wait for it without using up attempts
+jobs.register('upload', process_upload, retry_on=(UpstreamError,), defer_on=(UpstreamUnavailable,))
+jobs.start_workers()
+
+@app.route('/api/memes/<filename>', methods=['POST'])
+def upload_meme(filename):
+    """Queue a new meme for upload"""
+    try:
+        # Get the file from request
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if not file.filename:
+            return jsonify({'error': 'No file selected'}), 400
         
+        # Persist the upload and hand it to the worker pool so request threads stay free for reads
+        with phase('enqueue'):
+            job_id = jobs.enqueue(
+                'upload',
+                {'name': filename, 'file_name': file.filename},
+                attachment=file,
+                suffix=os.path.splitext(file.filename)[1].lower()
+            )
+        
+        status_url = url_for('get_job', job_id=job_id)
         return jsonify({
             'success': True,
-            'url': result['secure_url'],
-            'public_id': result['public_id']
-        })
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': status_url
+        }), 202, {'Location': status_url}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of a queued job"""
+    try:
+        job = jobs.get_job(job_id)
+        if job is None:
+            return jsonify({'error': f'Job {job_id} not found'}), 404
+        return jsonify(job)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -126,20 +137,21 @@ def delete_meme(filename):
     """Delete a meme"""
     try:
         # Remove from metadata
-        with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'r') as f:
-            metadata = json.load(f)
-        
-        # Remove all instances of the meme
-        for alias, data in list(metadata['meme_images'].items()):
-            if alias == filename:
-                del metadata['meme_images'][alias]
-        
-        with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'w') as f:
-            json.dump(metadata, f, indent=4)
+        with metadata_lock():
+            with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'r') as f:
+                metadata = json.load(f)
+
+            # Remove all instances of the meme
+            for alias, data in list(metadata['meme_images'].items()):
+                if alias == filename:
+                    del metadata['meme_images'][alias]
+
+            with open(os.path.join(STATIC_DIR, 'meme_metadata.json'), 'w') as f:
+                json.dump(metadata, f, indent=4)
         
         # Delete from Cloudinary
         try:
-            cloudinary.uploader.destroy(f"memes/{filename}")
+            gateway.destroy(filename)
         except Exception as e:
             # If file doesn't exist in Cloudinary, just log the error
             print(f"Warning: Could not delete from Cloudinary: {str(e)}")
@@ -158,58 +170,199 @@ def search_memes():
         if not query:
             return jsonify({'error': 'Query parameter "q" is required'}), 400
 
-        # Get all resources from Cloudinary with tags
-        result = cloudinary.api.resources(
-            type="upload",
-            prefix="memes/",
-            max_results=500,
-            tags=True,
-            context=True
-        )
+        # Get the catalog of memes with tags
+        with phase('upstream'):
+            catalog = gateway.get_catalog()
         
-        if not result['resources']:
+        if not len(catalog):
             return jsonify({'memes': []})
             
 
         # Search through memes
         matches = []
-        for resource in result['resources']:
-            name = resource['public_id'].replace('memes/', '')
-            tags = resource.get('tags', [])
-            context = resource.get('context', {}).get('custom', {})
-            
-            # Check each tag for matches
-            best_score = 0
-            for tag in tags:
-                # First check for exact substring match
-                if query in tag.lower():
-                    best_score = 100
-                    break
-                # If no exact match, use Levenshtein
-                score = fuzz.ratio(query, tag.lower())
-                best_score = max(best_score, score)
-            
-            if best_score >= threshold:
-                matches.append({
-                    'name': name,
-                    'url': resource['secure_url'],
-                    'width': resource.get('width', 0),
-                    'height': resource.get('height', 0),
-                    'tags': tags,
-                    'language': context.get('language', 'en'),
-                    'title': context.get('caption', name),
-                    'score': best_score
-                })
+        with phase('scoring'):
+            # Score each distinct tag once: exact substring match first, Levenshtein otherwise
+            tag_scores = [score_tag(query, tag) for tag in catalog.tags_lower]
+
+            meme_tag_scores = [tag_scores[tag_id] for tag_id in catalog.tag_ids]
+            offsets = catalog.tag_offsets
+
+            for index in range(len(catalog)):
+                best_score = max(meme_tag_scores[offsets[index]:offsets[index + 1]], default=0)
+                
+                if best_score >= threshold:
+                    meme = catalog.meme(index)
+                    meme['score'] = best_score
+                    matches.append(meme)
         
         # Sort by score
-        matches.sort(key=lambda x: x['score'], reverse=True)
+        with phase('sort'):
+            matches.sort(key=lambda x: x['score'], reverse=True)
         
-        return jsonify({
-            'memes': matches,
-            'query': query,
-            'threshold': threshold,
-            'total_matches': len(matches)
-        })
+        with phase('serialize'):
+            return jsonify({
+                'memes': matches,
+                'query': query,
+                'threshold': threshold,
+                'total_matches': len(matches)
+            })
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/memes/search/batch', methods=['POST'])
+def search_memes_batch():
+    """Answer many tag searches with a single pass over the catalog
+
+    Accepts a JSON list (or {"queries": [...]}) of {"q", "threshold", "limit"} items.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        items = payload.get('queries') if isinstance(payload, dict) else payload
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Body must be a non-empty list of queries'}), 400
+        if len(items) > MAX_BATCH_QUERIES:
+            return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+
+        queries = []
+        for position, item in enumerate(items):
+            query = str(item.get('q', '')).lower() if isinstance(item, dict) else ''
+            if not query:
+                return jsonify({'error': f'Query {position} is missing "q"'}), 400
+            try:
+                threshold = int(item.get('threshold', 75))
+                limit = item.get('limit')
+                limit = int(limit) if limit is not None else None
+            except (TypeError, ValueError):
+                return jsonify({'error': f'Query {position} needs integer "threshold" and "limit"'}), 400
+            if limit is not None and limit < 0:
+                return jsonify({'error': f'Query {position} has a negative "limit"'}), 400
+            queries.append((query, threshold, limit))
+
+        with phase('upstream'):
+            catalog = gateway.get_catalog()
+
+        with phase('scoring'):
+            matches_per_query = search_catalog(catalog, [(query, threshold) for query, threshold, _ in queries])
+
+        results = []
+        memes = {}
+        with phase('build'):
+            for (query, threshold, limit), matches in zip(queries, matches_per_query):
+                query_memes = []
+                for index, score in matches[:limit]:
+                    if index not in memes:
+                        memes[index] = catalog.meme(index)
+                    query_memes.append(dict(memes[index], score=score))
+                results.append({
+                    'memes': query_memes,
+                    'query': query,
+                    'threshold': threshold,
+                    'total_matches': len(matches)
+                })
+
+        with phase('serialize'):
+            return jsonify({'results': results})
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/memes/search/ranked', methods=['GET'])
+def search_memes_ranked():
+    """Search memes with BM25 ranking over tags and titles, returning the top results"""
+    try:
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 20))
+        fuzzy = request.args.get('fuzzy', 'true').lower() not in ('0', 'false', 'no')
+        
+        if not query.strip():
+            return jsonify({'error': 'Query parameter "q" is required'}), 400
+
+        with phase('upstream'):
+            catalog = gateway.get_catalog()
+
+        with phase('index'):
+            catalog, search_index = get_search_index(catalog)
+
+        with phase('scoring'):
+            results = search_index.search(query, limit=limit, fuzzy=fuzzy)
+
+        matches = []
+        for index, score in results:
+            meme = catalog.meme(index)
+            meme['score'] = round(score, 4)
+            matches.append(meme)
+        
+        with phase('serialize'):
+            return jsonify({
+                'memes': matches,
+                'query': query,
+                'limit': limit,
+                'total_matches': len(matches)
+            })
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/memes/suggest', methods=['GET'])
+def suggest_memes():
+    """Suggest tag and meme name completions for a typed prefix"""
+    try:
+        prefix = request.args.get('prefix', '').strip()
+        limit = int(request.args.get('limit', 10))
+        
+        if not prefix:
+            return jsonify({'error': 'Query parameter "prefix" is required'}), 400
+        if limit < 0:
+            return jsonify({'error': 'Query parameter "limit" must not be negative'}), 400
+
+        with phase('upstream'):
+            catalog = gateway.get_catalog()
+
+        with phase('index'):
+            _, suggest_index = get_suggest_index(catalog)
+
+        with phase('scoring'):
+            suggestions = suggest_index.suggest(prefix, limit=limit)
+        
+        with phase('serialize'):
+            return jsonify({
+                'prefix': prefix,
+                'suggestions': suggestions
+            })
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/memes/<filename>/image', methods=['GET'])
+def get_meme_image(filename):
+    """Serve a meme image, optionally a Cloudinary variant, from the local disk cache"""
+    try:
+        variant = request.args.get('variant', '').strip()
+
+        with phase('cache'):
+            image_file, etag = get_image(filename, variant)
+
+        # send_file answers If-None-Match and Range requests itself, and full
+        # responses go through the server's file wrapper (sendfile under gunicorn)
+        with phase('serialize'):
+            try:
+                return send_file(image_file, etag=etag, conditional=True, max_age=IMAGE_MAX_AGE)
+            except FileNotFoundError:
+                # Evicted by another request between the lookup and opening it; fetch it again
+                image_file, etag = get_image(filename, variant)
+                return send_file(image_file, etag=etag, conditional=True, max_age=IMAGE_MAX_AGE)
+    except ImageNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,193 @@
+import base64
+import hashlib
+
+from array import array
+
+MEME_PREFIX = 'memes/'
+
+# Fields written by Catalog.to_shared, besides the sparse title and URL overrides
+_ARRAY_FIELDS = (
+    'widths', 'heights', 'language_ids', 'tag_ids', 'tag_offsets',
+    'url_prefix_ids', 'versions', 'format_ids'
+)
+_LIST_FIELDS = ('names', 'languages', 'tags', 'tags_lower', 'url_prefixes', 'formats')
+
+class Catalog:
+    """Compact, read-only meme catalog
+
+    Per-meme fields are stored as column arrays indexed by meme position.
+    Tags, languages, formats and URL prefixes are interned into lookup tables
+    once and referenced by small integer ids, so a meme costs roughly its
+    name string plus a few dozen bytes instead of a nested Cloudinary dict.
+    """
+
+    __slots__ = (
+        'names', 'widths', 'heights',
+        'languages', 'language_ids',
+        'tags', 'tags_lower', 'tag_ids', 'tag_offsets',
+        'url_prefixes', 'url_prefix_ids', 'versions', 'formats', 'format_ids',
+        'titles', 'urls', '_name_index', '_fingerprint'
+    )
+
+    def __init__(self):
+        self.names = []
+        self.widths = array('I')
+        self.heights = array('I')
+        self.languages = []
+        self.language_ids = array('H')
+        self.tags = []
+        self.tags_lower = []
+        # Tags of meme i are tag_ids[tag_offsets[i]:tag_offsets[i + 1]]
+        self.tag_ids = array('I')
+        self.tag_offsets = array('I', [0])
+        self.url_prefixes = []
+        self.url_prefix_ids = array('H')
+        self.versions = array('Q')
+        self.formats = []
+        self.format_ids = array('H')
+        # Sparse overrides for the few memes that don't follow the common shape
+        self.titles = {}
+        self.urls = {}
+        self._name_index = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_resources(cls, resources):
+        """Build a catalog from Cloudinary resource dicts"""
+        catalog = cls()
+        tag_lookup = {}
+        language_lookup = {}
+        prefix_lookup = {}
+        format_lookup = {}
+
+        for resource in resources:
+            index = len(catalog.names)
+            public_id = resource['public_id']
+            name = public_id.replace(MEME_PREFIX, '', 1)
+            context = resource.get('context', {}).get('custom', {})
+
+            catalog.names.append(name)
+            catalog.widths.append(resource.get('width') or 0)
+            catalog.heights.append(resource.get('height') or 0)
+            catalog.language_ids.append(
+                _intern(context.get('language', 'en'), language_lookup, catalog.languages)
+            )
+
+            for tag in resource.get('tags', []):
+                if tag not in tag_lookup:
+                    catalog.tags_lower.append(tag.lower())
+                catalog.tag_ids.append(_intern(tag, tag_lookup, catalog.tags))
+            catalog.tag_offsets.append(len(catalog.tag_ids))
+
+            title = context.get('caption', name)
+            if title != name:
+                catalog.titles[index] = title
+
+            # secure_url is normally <prefix>v<version>/<public_id>.<format>
+            url = resource['secure_url']
+            split_at = url.find('/upload/') + len('/upload/')
+            prefix = url[:split_at]
+            version = resource.get('version') or 0
+            url_format = resource.get('format') or ''
+
+            catalog.url_prefix_ids.append(_intern(prefix, prefix_lookup, catalog.url_prefixes))
+            catalog.versions.append(version)
+            catalog.format_ids.append(_intern(url_format, format_lookup, catalog.formats))
+            if url != f"{prefix}v{version}/{public_id}.{url_format}":
+                catalog.urls[index] = url
+
+        return catalog
+
+    def to_shared(self):
+        """JSON-serializable form for handing the catalog to other workers
+
+        Column arrays are stored as base64 of their raw bytes, which only
+        processes on the same machine read back.
+        """
+        shared = {field: getattr(self, field) for field in _LIST_FIELDS}
+        for field in _ARRAY_FIELDS:
+            shared[field] = base64.b64encode(getattr(self, field).tobytes()).decode('ascii')
+        shared['titles'] = list(self.titles.items())
+        shared['urls'] = list(self.urls.items())
+        return shared
+
+    @classmethod
+    def from_shared(cls, shared):
+        """Rebuild a catalog written by to_shared"""
+        catalog = cls()
+        for field in _LIST_FIELDS:
+            setattr(catalog, field, shared[field])
+        for field in _ARRAY_FIELDS:
+            values = array(getattr(catalog, field).typecode)
+            values.frombytes(base64.b64decode(shared[field]))
+            setattr(catalog, field, values)
+        catalog.titles = dict(shared['titles'])
+        catalog.urls = dict(shared['urls'])
+        return catalog
+
+    def __len__(self):
+        return len(self.names)
+
+    def tag_ids_of(self, index):
+        return self.tag_ids[self.tag_offsets[index]:self.tag_offsets[index + 1]]
+
+    def tags_of(self, index):
+        return [self.tags[tag_id] for tag_id in self.tag_ids_of(index)]
+
+    def url(self, index):
+        url = self.urls.get(index)
+        if url is not None:
+            return url
+        return (
+            f"{self.url_prefixes[self.url_prefix_ids[index]]}v{self.versions[index]}/"
+            f"{MEME_PREFIX}{self.names[index]}.{self.formats[self.format_ids[index]]}"
+        )
+
+    def title(self, index):
+        return self.titles.get(index, self.names[index])
+
+    def language(self, index):
+        return self.languages[self.language_ids[index]]
+
+    def index_of(self, name):
+        """Position of a meme by name, or None"""
+        if self._name_index is None:
+            self._name_index = {meme_name: index for index, meme_name in enumerate(self.names)}
+        return self._name_index.get(name)
+
+    def fingerprint(self):
+        """Digest of the names, tags and titles that search indexes are built from
+
+        Listings refreshed without changes produce new Catalog objects with the
+        same fingerprint, so indexes built for the old object stay valid.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update('\0'.join(self.names).encode('utf-8'))
+            digest.update(b'\1')
+            digest.update('\0'.join(self.tags).encode('utf-8'))
+            digest.update(self.tag_ids.tobytes())
+            digest.update(self.tag_offsets.tobytes())
+            digest.update(repr(sorted(self.titles.items())).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def meme(self, index):
+        """Materialize one meme as the dict the API returns"""
+        return {
+            'name': self.names[index],
+            'url': self.url(index),
+            'width': self.widths[index],
+            'height': self.heights[index],
+            'tags': self.tags_of(index),
+            'language': self.language(index),
+            'title': self.title(index)
+        }
+
+def _intern(value, lookup, table):
+    """Return the id of value in table, adding it on first sight"""
+    value_id = lookup.get(value)
+    if value_id is None:
+        value_id = lookup[value] = len(table)
+        table.append(value)
+    return value_id
@@ -0,0 +1,61 @@
+import threading
+
+from .singleflight import single_flight
+
+class CatalogIndexCache:
+    """Holds an index derived from the catalog and rebuilds it off the request path
+
+    Indexes refer to memes by catalog position, so `get` returns the catalog
+    an index was built for together with the index. A refreshed catalog with
+    the same fingerprint reuses the current index; a changed one is indexed in
+    a background thread while the previous pair keeps being served. Only the
+    very first build runs on the request path.
+    """
+
+    def __init__(self, name, build):
+        self._name = name
+        self._build = build
+        self._lock = threading.Lock()
+        self._current = None
+        self._building = None
+
+    def get(self, catalog):
+        """Return (catalog, index) for the newest catalog that has been indexed"""
+        fingerprint = catalog.fingerprint()
+        with self._lock:
+            current = self._current
+            if current is not None:
+                if current[2] == fingerprint:
+                    if current[0] is not catalog:
+                        # Same memes, but keep the newest object for its fresh URLs
+                        self._current = (catalog, current[1], fingerprint)
+                    return catalog, current[1]
+                if self._building != fingerprint:
+                    self._building = fingerprint
+                    threading.Thread(
+                        target=self._rebuild,
+                        args=(catalog, fingerprint),
+                        name=f"meme-{self._name}-index",
+                        daemon=True
+                    ).start()
+                return current[0], current[1]
+
+        index = single_flight((self._name, fingerprint), lambda: self._build(catalog), shared=False)
+        with self._lock:
+            if self._current is None:
+                self._current = (catalog, index, fingerprint)
+        return catalog, index
+
+    def _rebuild(self, catalog, fingerprint):
+        try:
+            index = self._build(catalog)
+        except Exception as e:
+            print(f"Warning: Could not rebuild {self._name} index: {str(e)}")
+            with self._lock:
+                self._building = None
+            return
+
+        with self._lock:
+            self._current = (catalog, index, fingerprint)
+            if self._building == fingerprint:
+                self._building = None
@@ -1,28 +1,16 @@
-
-from dotenv import load_dotenv
-load_dotenv()
-
-import os
-
-from pathlib import Path
 from rich.console import Console
 
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
+from . import gateway
+from .fuzzy_search import match_keyword
 
 console = Console()
 
 def init_cloudinary():
     """Initialize Cloudinary configuration from .env"""
     try:
-
-        cloudinary_url = os.getenv('CLOUDINARY_URL')
-        if not cloudinary_url:
+        if not gateway.configure():
             console.print("[red]Error: CLOUDINARY_URL not found in .env")
             return False
-            
-        cloudinary.config(secure=True)
         return True
     except Exception as e:
         console.print(f"[red]Error initializing Cloudinary: {str(e)}")
@@ -32,17 +20,12 @@ def upload_image(file_path, name, tags=None, title=None, language='en'):
     """Upload image to Cloudinary with metadata"""
     try:
         with open(file_path, 'rb') as f:
-            result = cloudinary.uploader.upload(
+            gateway.upload(
                 f,
-                public_id=f"memes/{name}",
-                tags=tags or []
+                name,
+                tags=tags,
+                context={'language': language, 'caption': title or name}
             )
-
-        # Add contextual metadata
-        cloudinary.uploader.add_context(
-            f"language={language}|caption={title or name}",
-            [f"memes/{name}"]
-        )
         return True
     except Exception as e:
         console.print(f"[red]Error uploading {name}: {str(e)}")
@@ -51,7 +34,7 @@ def upload_image(file_path, name, tags=None, title=None, language='en'):
 def delete_image(name):
     """Delete image from Cloudinary"""
     try:
-        cloudinary.uploader.destroy(f"memes/{name}")
+        gateway.destroy(name)
         return True
     except Exception as e:
         console.print(f"[red]Error deleting {name}: {str(e)}")
@@ -60,13 +43,7 @@ def delete_image(name):
 def list_images(with_metadata=False):
     """List all images in Cloudinary"""
     try:
-        return cloudinary.api.resources(
-            type="upload",
-            prefix="memes/",
-            max_results=500,
-            tags=with_metadata,
-            context=with_metadata
-        )
+        return {'resources': gateway.list_resources(with_metadata=with_metadata)}
     except Exception as e:
         console.print(f"[red]Error listing images: {str(e)}")
         return None 
@@ -75,25 +52,44 @@ def update_image_metadata(name, tags=None, language=None):
     """Update image metadata in Cloudinary"""
     try:
         if tags is not None:
-            cloudinary.uploader.replace_tag(tags, [f"memes/{name}"])
+            gateway.replace_tags(name, tags)
         if language is not None:
-            cloudinary.uploader.add_context(f"language={language}", [f"memes/{name}"])
+            gateway.add_context(name, language=language)
         return True
     except Exception as e:
         console.print(f"[red]Error updating metadata for {name}: {str(e)}")
         return False
 
 def search_images(keyword, threshold=60):
-    """Search images in Cloudinary"""
+    """Search images in Cloudinary by keyword, best matches first"""
     try:
-        result = cloudinary.api.resources(
-            type="upload",
-            prefix="memes/",
-            max_results=500,
-            tags=True,
-            context=True
-        )
-        return result['resources']
+        resources = gateway.list_resources(with_metadata=True)
+        entries = [
+            (resource['public_id'].replace('memes/', ''), resource.get('tags', []))
+            for resource in resources
+        ]
+        return [
+            {
+                'name': entries[position][0],
+                'tags': entries[position][1],
+                'score': score,
+                'url': resources[position]['secure_url']
+            }
+            for position, score in match_keyword(keyword, entries, threshold)
+        ]
     except Exception as e:
         console.print(f"[red]Error searching images: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
+
+def lookup_urls(names):
+    """Look up secure URLs in Cloudinary for the given meme names"""
+    try:
+        wanted = set(names)
+        return {
+            resource['public_id'].replace('memes/', ''): resource['secure_url']
+            for resource in gateway.list_resources(with_metadata=False)
+            if resource['public_id'].replace('memes/', '') in wanted
+        }
+    except Exception as e:
+        console.print(f"[red]Error looking up URLs: {str(e)}")
+        return {}
@@ -0,0 +1,130 @@
+from bisect import bisect_left, bisect_right
+from itertools import compress, repeat
+
+from fuzzywuzzy import fuzz
+
+try:
+    # fuzz.ratio delegates to this when python-Levenshtein is installed; calling it
+    # directly skips fuzzywuzzy's per-call argument checks, which cost more than the match
+    from Levenshtein import ratio as levenshtein_ratio
+except ImportError:
+    levenshtein_ratio = None
+
+def _fuzz_similarity(query, tag):
+    """fuzz.ratio as a 0-1 float, matching levenshtein_ratio"""
+    return fuzz.ratio(query, tag) / 100
+
+def score_tag(query, tag):
+    """Score a lowercased tag: 100 for a substring match, Levenshtein ratio otherwise"""
+    if query in tag:
+        return 100
+    if levenshtein_ratio is None:
+        return fuzz.ratio(query, tag)
+    return int(round(100 * levenshtein_ratio(query, tag)))
+
+def _length_bounds(query_length, threshold):
+    """Tag lengths whose Levenshtein ratio against the query can still round up to threshold
+
+    The ratio is at most 2 * min(la, lb) / (la + lb), so tags much shorter or
+    longer than the query can only match as substrings.
+    """
+    target = threshold - 0.5
+    if target <= 0:
+        return 0, float('inf')
+    if target >= 200:
+        return float('inf'), -1
+    return (
+        target * query_length / (200 - target) - 1e-9,
+        query_length * (200 - target) / target + 1e-9
+    )
+
+def search_catalog(catalog, queries):
+    """Fuzzy-match many (query, threshold) pairs against the catalog's tags in one pass
+
+    Identical pairs are scored once, and tags whose length rules out the
+    threshold only get the substring check. Each tag keeps the (query, score)
+    hits that clear their threshold, so the pass over the catalog skips memes
+    without hits and only merges the few hits of the rest.
+
+    Returns one list per query of (meme position, score), best first, with
+    ties kept in catalog order.
+    """
+    distinct = {}
+    for pair in queries:
+        distinct.setdefault(pair, len(distinct))
+
+    tags = catalog.tags_lower
+    # Tag ids ordered by length, so each query only reads the lengths its threshold allows
+    by_length = sorted(range(len(tags)), key=lambda tag_id: len(tags[tag_id]))
+    tags_by_length = [tags[tag_id] for tag_id in by_length]
+    lengths = [len(tag) for tag in tags_by_length]
+    similarity = levenshtein_ratio or _fuzz_similarity
+    tag_hits = [[] for _ in tags]
+    for position, (query, threshold) in enumerate(distinct):
+        substrings = {tag_id for tag_id, tag in enumerate(tags) if query in tag}
+        if threshold <= 100:
+            for tag_id in substrings:
+                tag_hits[tag_id].append((position, 100))
+
+        shortest, longest = _length_bounds(len(query), threshold)
+        start, stop = bisect_left(lengths, shortest), bisect_right(lengths, longest)
+        # Ratios run in C over the window; Python only sees the few that can clear the threshold
+        ratios = list(map(similarity, repeat(query), tags_by_length[start:stop]))
+        cutoff = (threshold - 0.5) / 100 - 1e-9
+        for tag_id, ratio in compress(zip(by_length[start:stop], ratios), map(cutoff.__le__, ratios)):
+            score = int(round(100 * ratio))
+            if score >= threshold and tag_id not in substrings:
+                tag_hits[tag_id].append((position, score))
+
+    results = [[] for _ in distinct]
+    match_all = [position for position, (_, threshold) in enumerate(distinct) if threshold <= 0]
+    tag_ids = catalog.tag_ids
+    offsets = catalog.tag_offsets
+    for index in range(len(catalog)):
+        meme_hits = [tag_hits[tag_id] for tag_id in tag_ids[offsets[index]:offsets[index + 1]] if tag_hits[tag_id]]
+        if not meme_hits:
+            # A meme without tags scores 0, which only thresholds of 0 or less accept
+            for position in match_all:
+                results[position].append((index, 0))
+            continue
+
+        if len(meme_hits) == 1:
+            best_scores = meme_hits[0]
+        else:
+            # Best score per query across the meme's tags
+            best = {}
+            for hits in meme_hits:
+                for position, score in hits:
+                    if score > best.get(position, -1):
+                        best[position] = score
+            best_scores = best.items()
+
+        for position, score in best_scores:
+            results[position].append((index, score))
+
+    for query_results in results:
+        query_results.sort(key=lambda match: match[1], reverse=True)
+    return [results[distinct[pair]] for pair in queries]
+
+def match_keyword(keyword, entries, threshold):
+    """Score (name, tags) entries by the best partial match of keyword in the name or a tag
+
+    Each distinct tag is scored once. Returns (position, score) pairs at or
+    above threshold, best first.
+    """
+    keyword = keyword.lower()
+    tag_scores = {}
+    matches = []
+    for position, (name, tags) in enumerate(entries):
+        score = fuzz.partial_ratio(keyword, name.lower())
+        for tag in tags:
+            tag_score = tag_scores.get(tag)
+            if tag_score is None:
+                tag_score = tag_scores[tag] = fuzz.partial_ratio(keyword, tag.lower())
+            score = max(score, tag_score)
+
+        if score >= threshold:
+            matches.append((position, score))
+
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches
@@ -0,0 +1,326 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import calendar
+import os
+import random
+import socket
+import threading
+import time
+
+import cloudinary
+import cloudinary.uploader
+import cloudinary.api
+
+from cloudinary.api_client import call_api
+from cloudinary.exceptions import Error, GeneralError, RateLimited
+from cloudinary.utils import get_http_connector
+from urllib.parse import urlparse
+from urllib3 import Timeout
+
+from .catalog import Catalog, MEME_PREFIX
+from .singleflight import forget, single_flight
+
+# Messages the uploader uses when wrapping network failures in a plain Error
+_TRANSIENT_MESSAGES = ('Unexpected error', 'Socket error', 'Error parsing server response')
+
+class UpstreamError(Exception):
+    """Raised when Cloudinary could not serve a request after retries"""
+
+class UpstreamUnavailable(UpstreamError):
+    """Raised without calling Cloudinary while it is unhealthy or rate limited
+
+    `retry_after` is the number of seconds until a call may be let through again.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+_lock = threading.Lock()
+_settings = {}
+_state = {
+    'configured': False,
+    'failures': 0,
+    'opened_at': None,
+    'trial_in_flight': False,
+    'rate_limit_remaining': None,
+    'rate_limit_reset_at': None
+}
+_cache = {}
+
+def configure():
+    """Configure Cloudinary from CLOUDINARY_URL and install the shared connection pool
+
+    Safe to call repeatedly; only the first successful call builds the pool.
+    Returns False when CLOUDINARY_URL is missing.
+    """
+    with _lock:
+        if _state['configured']:
+            return True
+
+        if not os.getenv('CLOUDINARY_URL'):
+            return False
+
+        cloudinary.reset_config()
+        cloudinary.config(secure=True)
+
+        _settings.update(
+            connect_timeout=float(os.getenv('MEME_UPSTREAM_CONNECT_TIMEOUT', 3)),
+            read_timeout=float(os.getenv('MEME_UPSTREAM_READ_TIMEOUT', 10)),
+            upload_timeout=float(os.getenv('MEME_UPLOAD_TIMEOUT', 60)),
+            retries=int(os.getenv('MEME_UPSTREAM_RETRIES', 2)),
+            backoff=float(os.getenv('MEME_UPSTREAM_BACKOFF', 0.25)),
+            breaker_threshold=int(os.getenv('MEME_BREAKER_THRESHOLD', 5)),
+            breaker_cooldown=float(os.getenv('MEME_BREAKER_COOLDOWN', 30)),
+            catalog_ttl=float(os.getenv('MEME_CATALOG_TTL', 60))
+        )
+
+        # One keep-alive pool shared by the Admin API and the uploader. Retries are
+        # handled here, so urllib3 must not retry (or block) on its own.
+        http = get_http_connector(cloudinary.config(), dict(
+            cloudinary.CERT_KWARGS,
+            maxsize=int(os.getenv('MEME_UPSTREAM_POOL_SIZE', 8)),
+            block=False,
+            retries=False
+        ))
+        call_api._http = http
+        cloudinary.uploader._http = http
+
+        _state['configured'] = True
+        return True
+
+def is_reachable(timeout=1.0):
+    """Check that Cloudinary is configured and its API host accepts connections"""
+    if not configure():
+        return False
+
+    host = urlparse(cloudinary.config().upload_prefix or 'https://api.cloudinary.com').hostname
+    try:
+        socket.create_connection((host, 443), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+def _timeout(upload=False):
+    read_timeout = _settings['upload_timeout'] if upload else _settings['read_timeout']
+    return Timeout(connect=_settings['connect_timeout'], read=read_timeout)
+
+def _is_transient(error):
+    """Network failures and server errors are worth retrying; client errors are not"""
+    if isinstance(error, GeneralError):
+        return True
+    return type(error) is Error and str(error).startswith(_TRANSIENT_MESSAGES)
+
+def _breaker_allows():
+    """Check the circuit breaker, letting a single trial call through after the cooldown"""
+    with _lock:
+        if _state['opened_at'] is None:
+            return True
+        if _state['trial_in_flight']:
+            return False
+        if time.monotonic() - _state['opened_at'] < _settings['breaker_cooldown']:
+            return False
+        _state['trial_in_flight'] = True
+        return True
+
+def _breaker_retry_after():
+    """Seconds until the open breaker lets a trial call through"""
+    with _lock:
+        if _state['opened_at'] is None:
+            return 0.0
+        return max(0.0, _state['opened_at'] + _settings['breaker_cooldown'] - time.monotonic())
+
+def _record_success():
+    with _lock:
+        _state['failures'] = 0
+        _state['opened_at'] = None
+        _state['trial_in_flight'] = False
+
+def _release_trial():
+    """End a half-open trial that neither succeeded nor failed upstream"""
+    with _lock:
+        _state['trial_in_flight'] = False
+
+def _record_failure():
+    with _lock:
+        _state['failures'] += 1
+        _state['trial_in_flight'] = False
+        if _state['opened_at'] is not None or _state['failures'] >= _settings['breaker_threshold']:
+            _state['opened_at'] = time.monotonic()
+
+def _rate_limited():
+    with _lock:
+        reset_at = _state['rate_limit_reset_at']
+        return _state['rate_limit_remaining'] == 0 and reset_at is not None and time.time() < reset_at
+
+def _note_rate_limit(response, exhausted=False):
+    """Track the Admin API budget from the X-FeatureRateLimit headers"""
+    remaining = 0 if exhausted else getattr(response, 'rate_limit_remaining', None)
+    reset_at = getattr(response, 'rate_limit_reset_at', None)
+
+    with _lock:
+        if remaining is not None:
+            _state['rate_limit_remaining'] = remaining
+        if reset_at:
+            _state['rate_limit_reset_at'] = calendar.timegm(reset_at[:6])
+        elif exhausted:
+            _state['rate_limit_reset_at'] = time.time() + _settings['breaker_cooldown']
+
+def _call(func, *args, admin=False, upload=False, rewind=None, **options):
+    """Call a Cloudinary SDK function with timeouts, jittered retries and circuit breaking"""
+    if not configure():
+        raise UpstreamError("CLOUDINARY_URL not found in environment variables")
+
+    if admin and _rate_limited():
+        raise UpstreamUnavailable(
+            "Cloudinary Admin API rate limit reached, retry later",
+            retry_after=_state['rate_limit_reset_at'] - time.time()
+        )
+
+    attempts = _settings['retries'] + 1
+    for attempt in range(attempts):
+        if not _breaker_allows():
+            raise UpstreamUnavailable("Cloudinary is unavailable, retry later", retry_after=_breaker_retry_after())
+
+        if rewind is not None:
+            rewind.seek(0)
+
+        try:
+            result = func(*args, timeout=_timeout(upload), **options)
+        except RateLimited as e:
+            _record_success()
+            _note_rate_limit(None, exhausted=True)
+            raise UpstreamUnavailable(str(e), retry_after=_state['rate_limit_reset_at'] - time.time()) from e
+        except Error as e:
+            if not _is_transient(e):
+                _record_success()
+                raise
+            _record_failure()
+            if attempt + 1 == attempts:
+                raise UpstreamError(str(e)) from e
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, _settings['backoff'] * 2 ** attempt))
+            continue
+        except BaseException:
+            # Not an upstream verdict, but a trial call must not keep the breaker open for good
+            _release_trial()
+            raise
+
+        _record_success()
+        if admin:
+            _note_rate_limit(result)
+        return result
+
+def _iter_resources(with_metadata):
+    """Yield resources page by page, so each page can be dropped once consumed"""
+    next_cursor = None
+    while True:
+        page = _call(
+            cloudinary.api.resources,
+            admin=True,
+            type="upload",
+            prefix=MEME_PREFIX,
+            max_results=500,
+            tags=with_metadata,
+            context=with_metadata,
+            **({'next_cursor': next_cursor} if next_cursor else {})
+        )
+        next_cursor = page.get('next_cursor')
+        yield from page.get('resources', [])
+        if not next_cursor:
+            return
+
+def _cached(key, fetch):
+    """Serve a listing from the short-lived cache, refreshing it with `fetch`
+
+    When Cloudinary is failing or rate limited the last good value is
+    returned instead, however old it is.
+    """
+    configure()
+    cached = _cache.get(key)
+    if cached and time.monotonic() - cached['fetched_at'] < _settings.get('catalog_ttl', 0):
+        return cached['value']
+
+    try:
+        value = fetch()
+    except UpstreamError:
+        if cached:
+            return cached['value']
+        raise
+
+    _cache[key] = {'value': value, 'fetched_at': time.monotonic()}
+    return value
+
+def list_resources(with_metadata=True):
+    """List all meme resources as raw Cloudinary dicts
+
+    A listing another worker fetched within the cache TTL is reused instead
+    of paging through Cloudinary again.
+    """
+    key = ('resources', with_metadata)
+    return _cached(key, lambda: single_flight(
+        key,
+        lambda: list(_iter_resources(with_metadata)),
+        max_age=_settings.get('catalog_ttl', 0)
+    ))
+
+def get_catalog():
+    """Get the meme catalog in its compact in-memory form
+
+    The catalog is built while paging through the listing, so the raw
+    Cloudinary dicts of only one page are alive at a time. Concurrent misses
+    share one build, and other workers reuse it in its compact form until
+    the cache TTL runs out.
+    """
+    return _cached(('catalog',), lambda: single_flight(
+        ('catalog',),
+        lambda: Catalog.from_resources(_iter_resources(True)),
+        max_age=_settings.get('catalog_ttl', 0),
+        encode=Catalog.to_shared,
+        decode=Catalog.from_shared
+    ))
+
+def invalidate_catalog():
+    """Drop cached listings, here and shared with other workers, so the next read sees recent changes"""
+    _cache.clear()
+    for key in (('catalog',), ('resources', True), ('resources', False)):
+        forget(key)
+
+def upload(file, name, tags=None, context=None):
+    """Upload a file object or path as a meme"""
+    options = {'public_id': f"{MEME_PREFIX}{name}", 'tags': tags or []}
+    if context:
+        options['context'] = context
+
+    result = _call(
+        cloudinary.uploader.upload,
+        file,
+        upload=True,
+        rewind=file if hasattr(file, 'seek') else None,
+        **options
+    )
+    invalidate_catalog()
+    return result
+
+def destroy(name):
+    """Delete a meme"""
+    result = _call(cloudinary.uploader.destroy, f"{MEME_PREFIX}{name}")
+    invalidate_catalog()
+    return result
+
+def replace_tags(name, tags):
+    """Replace all tags on a meme"""
+    result = _call(cloudinary.uploader.replace_tag, tags, [f"{MEME_PREFIX}{name}"])
+    invalidate_catalog()
+    return result
+
+def add_context(name, **context):
+    """Add contextual metadata (language, caption, ...) to a meme"""
+    result = _call(
+        cloudinary.uploader.add_context,
+        '|'.join(f"{key}={value}" for key, value in context.items()),
+        [f"{MEME_PREFIX}{name}"]
+    )
+    invalidate_catalog()
+    return result
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+
+from pathlib import Path
+from urllib.parse import urlparse
+
+import urllib3
+
+from . import gateway
+from .gateway import UpstreamError
+from .singleflight import single_flight
+from ..utils.paths import get_paths
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif']
+# Named variants and the fixed Cloudinary transformation and file extension they
+# map to; only these are requested, so clients cannot create new billable
+# transformations. Cloudinary converts to the format the extension names.
+IMAGE_VARIANTS = {
+    'thumb': ('c_thumb,w_200,h_200', None),
+    'small': ('c_limit,w_400', None),
+    'medium': ('c_limit,w_800', None),
+    'webp': (None, '.webp')
+}
+
+_lock = threading.Lock()
+_upstream = {'fetch': None, 'http': None}
+
+class ImageNotFound(Exception):
+    """Raised when a meme image exists neither locally nor upstream"""
+
+def _cache_dir():
+    return get_paths()['cache'] / 'images'
+
+def _max_cache_bytes():
+    return int(float(os.getenv('MEME_IMAGE_CACHE_MB', 1024)) * 1024 * 1024)
+
+def set_upstream(fetch):
+    """Replace the upstream fetcher, e.g. with a local stand-in in tests
+
+    `fetch(url, file)` must write the image bytes to the binary file object or
+    raise ImageNotFound. Pass None to restore the HTTP fetcher.
+    """
+    _upstream['fetch'] = fetch
+
+def _fetch_http(url, file):
+    with _lock:
+        if _upstream['http'] is None:
+            _upstream['http'] = urllib3.PoolManager(
+                maxsize=int(os.getenv('MEME_UPSTREAM_POOL_SIZE', 8)),
+                timeout=urllib3.Timeout(
+                    connect=float(os.getenv('MEME_UPSTREAM_CONNECT_TIMEOUT', 3)),
+                    read=float(os.getenv('MEME_UPSTREAM_READ_TIMEOUT', 10))
+                ),
+                retries=urllib3.Retry(total=2, backoff_factor=0.25, status_forcelist=[502, 503, 504])
+            )
+
+    try:
+        response = _upstream['http'].request('GET', url, preload_content=False)
+    except urllib3.exceptions.HTTPError as e:
+        raise UpstreamError(f"Could not fetch image: {str(e)}") from e
+
+    try:
+        if response.status == 404:
+            raise ImageNotFound(f"Image not found upstream: {url}")
+        if response.status != 200:
+            raise UpstreamError(f"Image fetch failed with status {response.status}")
+        for chunk in response.stream(64 * 1024):
+            file.write(chunk)
+    finally:
+        response.release_conn()
+
+def local_original(name):
+    """Find the original image for a meme in _images/uploaded"""
+    uploaded_dir = get_paths()['uploaded']
+    for ext in IMAGE_EXTENSIONS:
+        image_file = uploaded_dir / f"{name}{ext}"
+        if image_file.is_file():
+            return image_file
+    return None
+
+def variant_url(url, transformation=None, extension=None):
+    """Insert a Cloudinary transformation into a delivery URL, optionally changing its extension"""
+    if not transformation and not extension:
+        return url
+
+    marker = '/upload/'
+    split_at = url.find(marker)
+    if split_at < 0:
+        raise ValueError("Variants are only available for Cloudinary URLs")
+    if extension:
+        url = os.path.splitext(url)[0] + extension
+    if not transformation:
+        return url
+    split_at += len(marker)
+    return f"{url[:split_at]}{transformation}/{url[split_at:]}"
+
+def cached_image(url):
+    """Path of the cached copy of url, fetching it upstream on a miss"""
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    ext = Path(urlparse(url).path).suffix.lower()
+    image_file = _cache_dir() / f"{digest}{ext}"
+
+    if image_file.exists():
+        try:
+            # Hits refresh the modification time that eviction orders by
+            os.utime(image_file)
+            return image_file
+        except FileNotFoundError:
+            pass
+
+    # Concurrent misses for the same URL in this worker share one download
+    return Path(single_flight(('image', url), lambda: _populate(url, image_file), shared=False))
+
+def _populate(url, image_file):
+    if image_file.exists():
+        return str(image_file)
+
+    image_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = image_file.with_name(f".{image_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_file, 'wb') as f:
+            (_upstream['fetch'] or _fetch_http)(url, f)
+        os.replace(tmp_file, image_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+    _evict(keep=image_file)
+    return str(image_file)
+
+def _evict(keep):
+    """Delete least recently used images until the cache fits its size budget"""
+    entries = []
+    total = 0
+    for image_file in _cache_dir().iterdir():
+        if image_file.name.startswith('.') or image_file == keep:
+            continue
+        try:
+            stat = image_file.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, image_file))
+        total += stat.st_size
+
+    try:
+        total += keep.stat().st_size
+    except FileNotFoundError:
+        pass
+
+    budget = _max_cache_bytes()
+    for _, size, image_file in sorted(entries):
+        if total <= budget:
+            break
+        image_file.unlink(missing_ok=True)
+        total -= size
+
+def get_image(name, variant=''):
+    """Resolve a meme image to a local file, returning (path, etag)
+
+    Originals present in _images/uploaded are served in place; everything
+    else comes from the size-bounded disk cache, keyed by the versioned URL.
+    `variant` is one of IMAGE_VARIANTS, or empty for the original.
+    """
+    if not name or name.startswith('.') or '/' in name or '\\' in name:
+        raise ImageNotFound(f"Image {name} not found")
+    if variant and variant not in IMAGE_VARIANTS:
+        raise ValueError(f"Unknown variant {variant}, expected one of: {', '.join(IMAGE_VARIANTS)}")
+
+    if not variant:
+        original = local_original(name)
+        if original:
+            stat = original.stat()
+            return original, f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    catalog = gateway.get_catalog()
+    index = catalog.index_of(name)
+    if index is None:
+        raise ImageNotFound(f"Image {name} not found")
+
+    image_file = cached_image(variant_url(catalog.url(index), *IMAGE_VARIANTS.get(variant, (None, None))))
+    return image_file, image_file.stem
@@ -0,0 +1,162 @@
+import json
+import os
+
+from collections import Counter
+
+from fuzzywuzzy import fuzz
+from rich.console import Console
+
+from .metadata import load_metadata
+from ..utils.paths import get_paths
+
+console = Console()
+
+INDEX_VERSION = 2
+
+def _index_file():
+    return get_paths()['cache'] / 'local_index.json'
+
+def _source_stamp():
+    """Identify the current meme_metadata.json by modification time and size"""
+    try:
+        stat = (get_paths()['static'] / 'meme_metadata.json').stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def build_local_index():
+    """Build the search index from meme_metadata.json and persist it
+
+    Each distinct lowercased name, title and tag is stored once as a term
+    with the positions of the memes that use it, and each character with the
+    terms that contain it, so a search scores every term once and skips terms
+    that share too few characters with the keyword to reach the threshold.
+    """
+    stamp = _source_stamp()
+    meta = load_metadata()
+
+    tags = []
+    tag_lookup = {}
+    memes = []
+    terms = []
+    term_lookup = {}
+    postings = []
+    for position, (name, data) in enumerate(meta['meme_images'].items()):
+        title = data.get('title', name)
+        tag_ids = []
+        for tag in data.get('tags', []):
+            if tag not in tag_lookup:
+                tag_lookup[tag] = len(tags)
+                tags.append(tag)
+            tag_ids.append(tag_lookup[tag])
+        memes.append([name, title, tag_ids])
+
+        for term in dict.fromkeys([name.lower(), title.lower(), *(tag.lower() for tag in data.get('tags', []))]):
+            term_id = term_lookup.get(term)
+            if term_id is None:
+                term_id = term_lookup[term] = len(terms)
+                terms.append(term)
+                postings.append([])
+            postings[term_id].append(position)
+
+    # A term id is listed once per occurrence of the character in the term
+    chars = {}
+    for term_id, term in enumerate(terms):
+        for char in term:
+            chars.setdefault(char, []).append(term_id)
+
+    index = {
+        'version': INDEX_VERSION,
+        'source': stamp,
+        'tags': tags,
+        'memes': memes,
+        'terms': terms,
+        'postings': postings,
+        'chars': chars
+    }
+
+    try:
+        index_file = _index_file()
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_file, index_file)
+    except OSError as e:
+        console.print(f"[yellow]Warning: Could not save local search index: {str(e)}")
+
+    return index
+
+def load_local_index():
+    """Load the persisted index, rebuilding it when meme_metadata.json has changed"""
+    try:
+        with open(_index_file(), 'r') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index.get('source') == _source_stamp():
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_local_index()
+
+def _candidate_terms(index, keyword, threshold):
+    """Ids of the terms whose partial_ratio against keyword can reach threshold
+
+    partial_ratio compares the shorter string of length s with an equally long
+    window of the other, so with m characters in common it is at most
+    2m / (s + m). The character postings bound m from above by the characters
+    the keyword and the whole term have in common.
+    """
+    terms = index['terms']
+    if threshold <= 0 or not keyword:
+        return range(len(terms))
+
+    shared = [0] * len(terms)
+    for char, count in Counter(keyword).items():
+        for term_id, term_count in Counter(index['chars'].get(char, ())).items():
+            shared[term_id] += min(count, term_count)
+
+    target = (threshold - 0.5) / 100 - 1e-9
+    candidates = []
+    for term_id, count in enumerate(shared):
+        if not count:
+            continue
+        shorter = min(len(keyword), len(terms[term_id]))
+        common = min(count, shorter)
+        if 2 * common / (shorter + common) >= target:
+            candidates.append(term_id)
+    return candidates
+
+def search_local(keyword, threshold=60):
+    """Search memes in local metadata by keyword, best matches first
+
+    A meme scores the best partial match of keyword in its name, title or tags.
+    """
+    try:
+        index = load_local_index()
+        keyword = keyword.lower()
+        terms = index['terms']
+        postings = index['postings']
+
+        best = {}
+        for term_id in _candidate_terms(index, keyword, threshold):
+            score = fuzz.partial_ratio(keyword, terms[term_id])
+            if score < threshold:
+                continue
+            for position in postings[term_id]:
+                if score > best.get(position, -1):
+                    best[position] = score
+
+        tags = index['tags']
+        results = []
+        for position, score in sorted(best.items(), key=lambda match: (-match[1], match[0])):
+            name, title, tag_ids = index['memes'][position]
+            results.append({
+                'name': name,
+                'title': title,
+                'tags': [tags[tag_id] for tag_id in tag_ids],
+                'score': score
+            })
+        return results
+    except Exception as e:
+        console.print(f"[red]Error searching local metadata: {str(e)}")
+        return []
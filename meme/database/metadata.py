@@ -1,11 +1,24 @@
 
 import json
+import threading
 
+from contextlib import contextmanager
 from pathlib import Path
 from rich.console import Console
 
 console = Console()
 
+_lock = threading.Lock()
+
+@contextmanager
+def metadata_lock():
+    """Serialize read-modify-write of meme_metadata.json across threads and processes"""
+    from ..utils.paths import get_paths
+    from .singleflight import file_lock
+
+    with _lock, file_lock(get_paths()['cache'] / 'meme_metadata.lock'):
+        yield
+
 def load_metadata():
     """Load metadata from JSON file"""
     try:
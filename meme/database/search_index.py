@@ -0,0 +1,228 @@
+import heapq
+import math
+import re
+
+from array import array
+from bisect import bisect_left
+from itertools import compress, repeat
+from operator import mul, neg
+
+from fuzzywuzzy import fuzz
+
+from .catalog_index import CatalogIndexCache
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# BM25 parameters and per-field weights
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'tags': 1.0, 'title': 0.6}
+
+# Unknown query terms are matched against vocabulary terms this similar (fuzz.ratio)
+FUZZY_MIN_RATIO = 80
+FUZZY_MAX_LENGTH_DIFF = 2
+
+# Slack for float rounding when comparing score bounds
+BOUND_EPSILON = 1e-9
+
+def tokenize(text):
+    """Lowercase and split on anything that isn't a letter or digit"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _field_tokens(catalog, index):
+    return {
+        'tags': [token for tag in catalog.tags_of(index) for token in tokenize(tag)],
+        'title': tokenize(catalog.title(index))
+    }
+
+class SearchIndex:
+    """BM25 index over meme tags and titles
+
+    Term weights are precomputed into a sparse term-by-meme matrix: each term
+    id owns a postings array of meme positions and a parallel array of
+    weights, so a query only sums the postings of its own terms. The largest
+    weight of each term bounds what it can add to a score, which lets
+    `search` skip postings that cannot reach the top results.
+    """
+
+    __slots__ = ('terms', 'postings', 'weights', 'max_weights', '_terms_by_initial')
+
+    def __init__(self):
+        self.terms = {}
+        self.postings = []
+        self.weights = []
+        self.max_weights = []
+        self._terms_by_initial = {}
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Build the index for a Catalog"""
+        search_index = cls()
+        doc_count = len(catalog)
+        if not doc_count:
+            return search_index
+
+        # First pass: document frequencies and average field lengths
+        doc_freq = {}
+        total_lengths = dict.fromkeys(FIELD_WEIGHTS, 0)
+        for index in range(doc_count):
+            fields = _field_tokens(catalog, index)
+            for field, tokens in fields.items():
+                total_lengths[field] += len(tokens)
+            for term in set(fields['tags']).union(fields['title']):
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+
+        average_lengths = {field: (total / doc_count) or 1.0 for field, total in total_lengths.items()}
+        idf = {
+            term: math.log(1 + (doc_count - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freq.items()
+        }
+
+        for term in doc_freq:
+            search_index._add_term(term)
+
+        # Second pass: saturated, length-normalized term weights per field
+        for index in range(doc_count):
+            weights = {}
+            for field, tokens in _field_tokens(catalog, index).items():
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                norm = K1 * (1 - B + B * len(tokens) / average_lengths[field])
+                for term, count in counts.items():
+                    weights[term] = weights.get(term, 0.0) + (
+                        FIELD_WEIGHTS[field] * count * (K1 + 1) / (count + norm)
+                    )
+
+            for term, weight in weights.items():
+                term_id = search_index.terms[term]
+                search_index.postings[term_id].append(index)
+                search_index.weights[term_id].append(weight * idf[term])
+
+        search_index.max_weights = [max(weights) for weights in search_index.weights]
+        return search_index
+
+    def _add_term(self, term):
+        self.terms[term] = len(self.postings)
+        self.postings.append(array('I'))
+        self.weights.append(array('f'))
+        self._terms_by_initial.setdefault(term[0], []).append(term)
+
+    def _expand(self, query, fuzzy):
+        """Map query tokens to vocabulary terms with a boost for fuzzy matches"""
+        boosts = {}
+        for token in tokenize(query):
+            if token in self.terms:
+                boosts[token] = 1.0
+                continue
+            if not fuzzy:
+                continue
+            for term in self._terms_by_initial.get(token[0], []):
+                if abs(len(term) - len(token)) > FUZZY_MAX_LENGTH_DIFF:
+                    continue
+                ratio = fuzz.ratio(token, term)
+                if ratio >= FUZZY_MIN_RATIO:
+                    boosts[term] = max(boosts.get(term, 0.0), ratio / 100)
+        return boosts
+
+    def search(self, query, limit=20, fuzzy=True):
+        """Return up to `limit` (meme position, score) pairs, best first
+
+        Terms are scored rarest first (MaxScore). Once the remaining terms
+        together cannot lift a meme that matched none of the scored terms into
+        the top `limit`, they only add to the surviving candidates, found by
+        binary search in their postings, instead of walking every posting.
+        """
+        if limit <= 0:
+            return []
+
+        matched = sorted(
+            ((self.terms[term], boost) for term, boost in self._expand(query, fuzzy).items()),
+            key=lambda item: len(self.postings[item[0]])
+        )
+        if not matched:
+            return []
+
+        # remaining[i] bounds what terms i.. can still add to any meme's score
+        remaining = [0.0] * (len(matched) + 1)
+        for position in range(len(matched) - 1, -1, -1):
+            term_id, boost = matched[position]
+            remaining[position] = remaining[position + 1] + self.max_weights[term_id] * boost
+
+        scores = self._term_scores(*matched[0])
+        for position in range(1, len(matched)):
+            threshold = self._threshold(scores, limit, remaining[position] + BOUND_EPSILON)
+            if remaining[position] + BOUND_EPSILON < threshold:
+                scores = self._add_to_candidates(scores, matched[position:], remaining[position:], threshold)
+                break
+            scores = self._accumulate(scores, *matched[position])
+
+        # Ties go to the earlier meme; negating positions also keeps the heap from
+        # churning on runs of equal scores, which are common with short tag lists
+        top = heapq.nlargest(limit, zip(scores.values(), map(neg, scores.keys())))
+        return [(-position, score) for score, position in top]
+
+    def _term_scores(self, term_id, boost):
+        """Scores of one term's postings, built in a single C-level pass"""
+        weights = self.weights[term_id]
+        if boost != 1.0:
+            weights = map(mul, weights, repeat(boost))
+        return dict(zip(self.postings[term_id], weights))
+
+    def _accumulate(self, scores, term_id, boost):
+        """Add every posting of a term to the scores
+
+        The union and intersection run in C; Python only sums the memes that
+        both sides score, which is a small share for all but the commonest terms.
+        """
+        term_scores = self._term_scores(term_id, boost)
+        merged = term_scores | scores
+        for index in scores.keys() & term_scores.keys():
+            merged[index] = scores[index] + term_scores[index]
+        return merged
+
+    @staticmethod
+    def _threshold(scores, limit, bound):
+        """Score of the current limit-th best candidate, or 0 while there are fewer
+
+        Returns early when even the best score does not exceed `bound`, since
+        no pruning is possible then.
+        """
+        if len(scores) < limit or max(scores.values()) <= bound:
+            return 0.0
+        return heapq.nlargest(limit, scores.values())[-1]
+
+    def _add_to_candidates(self, scores, matched, remaining, threshold):
+        """Score the remaining terms for candidates that can still make the top results"""
+        for position, (term_id, boost) in enumerate(matched):
+            cutoff = threshold - remaining[position] - BOUND_EPSILON
+            # Filter in C: keep positions whose score is at least the cutoff
+            candidates = list(compress(scores.keys(), map(cutoff.__le__, scores.values())))
+            postings = self.postings[term_id]
+
+            if len(candidates) * 16 < len(postings):
+                # Few candidates: binary search the postings instead of reading them all
+                weights = self.weights[term_id]
+                size = len(postings)
+                survivors = {}
+                for index in candidates:
+                    score = scores[index]
+                    at = bisect_left(postings, index)
+                    if at < size and postings[at] == index:
+                        score += weights[at] * boost
+                    survivors[index] = score
+            else:
+                get_weight = self._term_scores(term_id, boost).get
+                survivors = {index: scores[index] + get_weight(index, 0.0) for index in candidates}
+            scores = survivors
+        return scores
+
+_indexes = CatalogIndexCache('search', SearchIndex.from_catalog)
+
+def get_search_index(catalog):
+    """Get (catalog, index) for the newest indexed catalog
+
+    Positions returned by the index refer to the returned catalog, which may
+    be the previous one while a changed catalog is indexed in the background.
+    """
+    return _indexes.get(catalog)
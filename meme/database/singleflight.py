@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; coalescing stays per process
+    fcntl = None
+
+# Files of keys nobody asked for in this long are removed by the next sweep
+SHARED_FILE_MAX_AGE = 10 * 60
+
+_lock = threading.Lock()
+_inflight = {}
+_last_sweep = [0.0]
+
+def _shared_dir():
+    return Path(os.getenv('MEME_SINGLEFLIGHT_DIR', Path(tempfile.gettempdir()) / 'meme-singleflight'))
+
+def single_flight(key, fetch, shared=True, max_age=0, encode=None, decode=None):
+    """Run `fetch` once for all concurrent callers asking for the same key
+
+    Threads in this process wait for the leader's call and share its result or
+    error. Leaders in other workers serialize on a lock file and reuse a result
+    another worker wrote while they were waiting, or less than `max_age`
+    seconds ago. Shared results go through JSON; `encode` and `decode`
+    convert results that are not JSON-serializable, and shared=False
+    coalesces within this process only.
+    """
+    with _lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+    if not leader:
+        call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+    try:
+        if shared:
+            call['result'] = _fetch_across_workers(key, fetch, max_age, encode, decode)
+        else:
+            call['result'] = fetch()
+        return call['result']
+    except Exception as e:
+        call['error'] = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+        call['done'].set()
+
+def forget(key):
+    """Drop the shared result of key, so no worker reuses it"""
+    try:
+        (_shared_dir() / f"{_digest(key)}.json").unlink()
+    except OSError:
+        pass
+
+def _digest(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def _fetch_across_workers(key, fetch, max_age, encode, decode):
+    if fcntl is None:
+        return fetch()
+
+    digest = _digest(key)
+    shared_dir = _shared_dir()
+    result_file = shared_dir / f"{digest}.json"
+    started = time.time()
+
+    with file_lock(shared_dir / f"{digest}.lock"):
+        shared = _read_shared(result_file, newer_than=min(started, time.time() - max_age))
+        if shared is not None:
+            return decode(shared['result']) if decode else shared['result']
+
+        result = fetch()
+        _write_shared(result_file, encode(result) if encode else result)
+
+    _sweep(shared_dir)
+    return result
+
+@contextmanager
+def file_lock(lock_file):
+    """Hold an exclusive lock on lock_file, shared by all processes on this host
+
+    Every `with` opens the file anew, so threads of one process exclude each
+    other too. Without fcntl (Windows) this does not lock at all.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read_shared(result_file, newer_than):
+    """Read a result another worker wrote after newer_than"""
+    try:
+        with open(result_file, 'r') as f:
+            shared = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return shared if shared.get('written_at', 0) >= newer_than else None
+
+def _write_shared(result_file, result):
+    try:
+        tmp_file = result_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({'written_at': time.time(), 'result': result}, f)
+        os.replace(tmp_file, result_file)
+    except (OSError, TypeError, ValueError) as e:
+        # Sharing is an optimization; the caller still gets its result
+        print(f"Warning: Could not share upstream result: {str(e)}")
+
+def _sweep(shared_dir):
+    """Delete lock and result files of keys that have gone quiet, at most once a minute"""
+    now = time.time()
+    with _lock:
+        if now - _last_sweep[0] < 60:
+            return
+        _last_sweep[0] = now
+
+    cutoff = now - SHARED_FILE_MAX_AGE
+    try:
+        for path in shared_dir.iterdir():
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                if path.suffix != '.lock':
+                    path.unlink()
+                    continue
+                with open(path, 'r') as f:
+                    # Skip locks a worker holds right now
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    try:
+                        path.unlink()
+                    finally:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            except OSError:
+                continue
+    except OSError:
+        pass
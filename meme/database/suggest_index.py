@@ -0,0 +1,115 @@
+import heapq
+
+from array import array
+from bisect import bisect_left
+
+from .catalog_index import CatalogIndexCache
+
+MAX_SUGGESTIONS = 50
+# Prefixes matching more completions than this are too slow to rank per
+# keystroke, so their top completions are computed when the index is built
+MAX_SCAN = 256
+
+# Above the last code point there is nothing to increment to
+_MAX_CHAR = chr(0x10FFFF)
+
+class SuggestIndex:
+    """Prefix completion over tags and meme names
+
+    Completions live in one sorted array, so the matches for a prefix are a
+    contiguous range found with two binary searches. Tags are weighted by how
+    many memes carry them; meme names count once. Case variants share one
+    entry, labelled with their most common spelling.
+    """
+
+    __slots__ = ('keys', 'labels', 'kinds', 'weights', '_top_by_prefix')
+
+    def __init__(self):
+        self.keys = []
+        self.labels = []
+        self.kinds = []
+        self.weights = array('I')
+        self._top_by_prefix = {}
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Build the index for a Catalog"""
+        tag_counts = [0] * len(catalog.tags)
+        for tag_id in catalog.tag_ids:
+            tag_counts[tag_id] += 1
+
+        # Merge case variants ("Cat", "cat") of the same kind, summing their weights
+        merged = {}
+        candidates = [(tag, 'tag', count) for tag, count in zip(catalog.tags, tag_counts)]
+        candidates.extend((name, 'name', 1) for name in catalog.names)
+        for label, kind, weight in candidates:
+            entry_key = (label.lower(), kind)
+            entry = merged.get(entry_key)
+            if entry is None:
+                merged[entry_key] = [label, weight, weight]
+                continue
+            entry[1] += weight
+            if weight > entry[2]:
+                entry[0], entry[2] = label, weight
+
+        entries = sorted((key, kind, label, weight) for (key, kind), (label, weight, _) in merged.items())
+
+        suggest_index = cls()
+        for key, kind, label, weight in entries:
+            suggest_index.keys.append(key)
+            suggest_index.labels.append(label)
+            suggest_index.kinds.append(kind)
+            suggest_index.weights.append(weight)
+
+        suggest_index._precompute()
+        return suggest_index
+
+    def _range(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        # Keys starting with prefix sort below the smallest string greater than all of them
+        stem = prefix.rstrip(_MAX_CHAR)
+        if not stem:
+            return start, len(self.keys)
+        upper = stem[:-1] + chr(ord(stem[-1]) + 1)
+        return start, bisect_left(self.keys, upper, start)
+
+    def _top(self, start, end, limit):
+        weights = self.weights
+        # Heaviest first; within equal weight keep alphabetical order
+        return heapq.nlargest(limit, range(start, end), key=lambda position: (weights[position], -position))
+
+    def _precompute(self):
+        """Store top completions for every prefix whose range exceeds MAX_SCAN"""
+        pending = {key[:1] for key in self.keys if key}
+        while pending:
+            longer = set()
+            for prefix in pending:
+                start, end = self._range(prefix)
+                if end - start <= MAX_SCAN:
+                    continue
+                self._top_by_prefix[prefix] = self._top(start, end, MAX_SUGGESTIONS)
+                length = len(prefix) + 1
+                longer.update(key[:length] for key in self.keys[start:end] if len(key) >= length)
+            pending = longer
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` completions for a prefix, heaviest first"""
+        prefix = prefix.lower()
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not prefix or limit <= 0:
+            return []
+
+        positions = self._top_by_prefix.get(prefix)
+        if positions is None:
+            positions = self._top(*self._range(prefix), limit)
+
+        return [
+            {'text': self.labels[position], 'type': self.kinds[position], 'weight': self.weights[position]}
+            for position in positions[:limit]
+        ]
+
+_indexes = CatalogIndexCache('suggest', SuggestIndex.from_catalog)
+
+def get_suggest_index(catalog):
+    """Get (catalog, index) for the newest indexed catalog"""
+    return _indexes.get(catalog)
@@ -142,6 +142,8 @@ def generate_metadata():
                         "tags": tags,
                         "language": existing_entry.get("language", "en")
                     }
+                    if "optimization" in existing_entry:
+                        metadata["meme_images"][name]["optimization"] = existing_entry["optimization"]
                     image_count += 1
                 except Exception as e:
                     console.print(f"[red]Error processing {image_file.name}: {str(e)}")
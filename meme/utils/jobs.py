@@ -0,0 +1,253 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+from .paths import get_paths
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, run_after);
+"""
+
+_settings = {
+    'workers': 2,
+    'max_attempts': 3,
+    'backoff': 2.0,
+    'lease': 300.0,
+    'poll': 1.0,
+    'retention': 7 * 24 * 60 * 60
+}
+_handlers = {}
+_workers = []
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_local = threading.local()
+
+def _jobs_dir():
+    return get_paths()['jobs']
+
+def _connect():
+    """Per-thread connection to the job database, created on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        _jobs_dir().mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(_jobs_dir() / 'jobs.sqlite3', timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+def register(kind, handler, retry_on=(Exception,), defer_on=()):
+    """Register the handler for a job kind
+
+    `handler(payload)` returns a JSON-serializable result. Exceptions matching
+    `retry_on` are retried with exponential backoff; anything else fails the job.
+    Exceptions matching `defer_on` put the job back without using up an
+    attempt, until the exception's `retry_after` seconds (or the backoff) pass.
+    """
+    _handlers[kind] = (handler, retry_on, defer_on)
+
+def enqueue(kind, payload, attachment=None, suffix=''):
+    """Persist a job and wake a worker, returning the job id
+
+    An attachment (a file object or Flask FileStorage) is saved next to the
+    queue and its path passed to the handler as payload['attachment'].
+    """
+    job_id = uuid.uuid4().hex
+    payload = dict(payload)
+
+    if attachment is not None:
+        attachment_file = _jobs_dir() / 'attachments' / f"{job_id}{suffix}"
+        attachment_file.parent.mkdir(parents=True, exist_ok=True)
+        if hasattr(attachment, 'save'):
+            attachment.save(attachment_file)
+        else:
+            with open(attachment_file, 'wb') as f:
+                shutil.copyfileobj(attachment, f)
+        payload['attachment'] = str(attachment_file)
+
+    now = time.time()
+    _connect().execute(
+        "INSERT INTO jobs (id, kind, status, payload, run_after, created_at, updated_at) "
+        "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+        (job_id, kind, json.dumps(payload), now, now, now)
+    )
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    """Get the status of a job, or None if it does not exist"""
+    row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at']
+    }
+
+def start_workers():
+    """Start the background worker pool for this process
+
+    Reads MEME_JOB_WORKERS, MEME_JOB_MAX_ATTEMPTS, MEME_JOB_BACKOFF,
+    MEME_JOB_LEASE and MEME_JOB_RETENTION. Safe to call more than once.
+    """
+    with _lock:
+        if _workers:
+            return len(_workers)
+
+        _settings.update(
+            workers=int(os.getenv('MEME_JOB_WORKERS', 2)),
+            max_attempts=int(os.getenv('MEME_JOB_MAX_ATTEMPTS', 3)),
+            backoff=float(os.getenv('MEME_JOB_BACKOFF', 2.0)),
+            lease=float(os.getenv('MEME_JOB_LEASE', 300)),
+            retention=float(os.getenv('MEME_JOB_RETENTION', 7 * 24 * 60 * 60))
+        )
+
+        for number in range(_settings['workers']):
+            worker = threading.Thread(target=_work, name=f"meme-job-worker-{number}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        return len(_workers)
+
+def _claim(conn):
+    """Take the oldest due job, including jobs whose worker died mid-run
+
+    A job whose lease ran out on its last allowed attempt is failed instead,
+    so a job that kills its worker is not retried forever.
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        abandoned = conn.execute(
+            "SELECT id, payload, attempts FROM jobs WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, _settings['max_attempts'])
+        ).fetchall()
+        for job in abandoned:
+            _settle(
+                conn, job['id'], None, 'failed',
+                error=f"Worker stopped before finishing the job ({job['attempts']} attempts)"
+            )
+
+        row = conn.execute(
+            "SELECT id, kind, payload, attempts FROM jobs "
+            "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?) "
+            "ORDER BY created_at LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                "WHERE id = ?",
+                (now + _settings['lease'], now, row['id'])
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    for job in abandoned:
+        _remove_attachment(json.loads(job['payload']))
+    return row
+
+def _settle(conn, job_id, payload, status, result=None, error=None, run_after=None):
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, run_after = ?, lease_until = NULL, updated_at = ? "
+        "WHERE id = ?",
+        (status, json.dumps(result) if result is not None else None, error, run_after or now, now, job_id)
+    )
+    if status in ('succeeded', 'failed') and payload:
+        _remove_attachment(payload)
+
+def _defer(conn, job_id, error, run_after):
+    """Queue a job again without counting the attempt that just ran"""
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', attempts = attempts - 1, error = ?, run_after = ?, "
+        "lease_until = NULL, updated_at = ? WHERE id = ?",
+        (error, run_after, time.time(), job_id)
+    )
+
+def _remove_attachment(payload):
+    if payload.get('attachment'):
+        try:
+            os.remove(payload['attachment'])
+        except FileNotFoundError:
+            pass
+
+def _prune(conn):
+    """Drop finished jobs older than the retention period"""
+    conn.execute(
+        "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+        (time.time() - _settings['retention'],)
+    )
+
+def _work():
+    conn = _connect()
+    try:
+        _prune(conn)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not prune finished jobs: {str(e)}")
+
+    while True:
+        try:
+            row = _claim(conn)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not claim job: {str(e)}")
+            row = None
+
+        if row is None:
+            # Poll as well, so jobs queued by other processes and delayed retries are picked up
+            _wakeup.wait(_settings['poll'])
+            _wakeup.clear()
+            continue
+
+        try:
+            _run(conn, row)
+        except sqlite3.Error as e:
+            # The lease expires and another worker picks the job up again
+            print(f"Warning: Could not record result of job {row['id']}: {str(e)}")
+
+def _run(conn, row):
+    payload = json.loads(row['payload'])
+    handler, retry_on, defer_on = _handlers.get(row['kind'], (None, (), ()))
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {row['kind']} jobs")
+        result = handler(payload)
+    except Exception as e:
+        attempts = row['attempts'] + 1
+        if isinstance(e, defer_on):
+            delay = max(getattr(e, 'retry_after', None) or _settings['backoff'], _settings['poll'])
+            _defer(conn, row['id'], str(e), time.time() + delay)
+        elif isinstance(e, retry_on) and attempts < _settings['max_attempts']:
+            delay = _settings['backoff'] * 2 ** (attempts - 1)
+            _settle(conn, row['id'], payload, 'queued', error=str(e), run_after=time.time() + delay)
+        else:
+            _settle(conn, row['id'], payload, 'failed', error=str(e))
+        return
+
+    _settle(conn, row['id'], payload, 'succeeded', result=result)
@@ -0,0 +1,164 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import ExifTags, Image, ImageOps, ImageSequence
+
+from .paths import get_paths
+
+def _output_dir():
+    return get_paths()['cache'] / 'optimized'
+
+def _oriented(img):
+    """Rotate the pixels as the EXIF Orientation tag says and drop the tag
+
+    Images already upright are returned as they are, so lossless JPEG
+    recompression can still reuse their quantization tables.
+    """
+    if img.getexif().get(ExifTags.Base.Orientation, 1) == 1:
+        return img
+    return ImageOps.exif_transpose(img)
+
+def _resized(img, max_dimension, resample=Image.LANCZOS):
+    """Downscale so neither side exceeds max_dimension, keeping the aspect ratio"""
+    if not max_dimension or max(img.size) <= max_dimension:
+        return img
+    scale = max_dimension / max(img.size)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, resample)
+
+def _save_jpeg(img, target, max_dimension, lossy, quality):
+    oriented = _oriented(img)
+    resized = _resized(oriented, max_dimension)
+    options = {'optimize': True, 'progressive': True}
+    if img.info.get('icc_profile'):
+        options['icc_profile'] = img.info['icc_profile']
+    if oriented.getexif():
+        options['exif'] = oriented.getexif()
+    if lossy:
+        options['quality'] = quality
+    elif resized is img:
+        # Reuse the original quantization tables so recompression adds no visible loss
+        options['quality'] = 'keep'
+        options['subsampling'] = 'keep'
+    else:
+        options['quality'] = 95
+    if resized.mode not in ('RGB', 'L', 'CMYK'):
+        resized = resized.convert('RGB')
+    resized.save(target, 'JPEG', **options)
+    return resized.size
+
+def _save_png(img, target, max_dimension, lossy, quality):
+    oriented = _oriented(img)
+    resized = _resized(oriented, max_dimension)
+    options = {'optimize': True}
+    if img.info.get('icc_profile'):
+        options['icc_profile'] = img.info['icc_profile']
+    if oriented.getexif():
+        options['exif'] = oriented.getexif()
+    if resized.mode in ('RGB', 'RGBA', 'L', 'LA'):
+        if resized.mode in ('RGB', 'L') and resized.getcolors(256) is not None:
+            # Screenshots often use few enough colors for a palette, which loses nothing
+            resized = resized.convert('RGB').quantize(256, method=Image.Quantize.MEDIANCUT)
+        elif lossy:
+            # Quantizing everything else is where most of the lossy savings come from
+            rgba = 'A' in resized.getbands()
+            resized = resized.convert('RGBA' if rgba else 'RGB').quantize(
+                256, method=Image.Quantize.FASTOCTREE if rgba else Image.Quantize.MEDIANCUT
+            )
+    resized.save(target, 'PNG', **options)
+    return resized.size
+
+def _save_gif(img, target, max_dimension, lossy, quality):
+    mode = 'RGBA' if 'transparency' in img.info else 'RGB'
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(img):
+        durations.append(frame.info.get('duration', img.info.get('duration', 100)))
+        # Box filtering adds fewer new colors than Lanczos, keeping palettes and frame deltas small
+        frames.append(_resized(frame.convert(mode), max_dimension, Image.BOX))
+
+    options = {}
+    if 'loop' in img.info:
+        # Without a loop count in the source, writing one would make play-once GIFs loop forever
+        options['loop'] = img.info['loop']
+
+    # Pillow stores only the region that changed since the previous frame
+    frames[0].save(
+        target,
+        'GIF',
+        save_all=len(frames) > 1,
+        append_images=frames[1:],
+        duration=durations if len(frames) > 1 else durations[0],
+        optimize=True,
+        **options
+    )
+    return frames[0].size
+
+_SAVERS = {'JPEG': _save_jpeg, 'PNG': _save_png, 'GIF': _save_gif}
+
+def optimize_image(image_file, max_dimension=None, lossy=False, quality=85):
+    """Write an optimized copy of an image to _cache/optimized/
+
+    Returns the file to upload (the original when optimizing does not make it
+    smaller), byte counts and dimensions before and after.
+    """
+    image_file = Path(image_file)
+    original_bytes = image_file.stat().st_size
+    result = {
+        'name': image_file.stem,
+        'source': str(image_file),
+        'path': str(image_file),
+        'original_bytes': original_bytes,
+        'optimized_bytes': original_bytes,
+        'original_size': None,
+        'optimized_size': None,
+        'error': None
+    }
+
+    try:
+        with Image.open(image_file) as img:
+            result['original_size'] = list(img.size)
+            result['optimized_size'] = list(img.size)
+
+            saver = _SAVERS.get(img.format)
+            if saver is None:
+                raise ValueError(f"Unsupported image format: {img.format}")
+
+            target = _output_dir() / image_file.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            try:
+                optimized_size = saver(img, tmp_file, max_dimension, lossy, quality)
+                optimized_bytes = tmp_file.stat().st_size
+
+                # Keep the original unless the copy is smaller or had to be downscaled;
+                # a copy that was only rotated upright is no reason to upload more bytes
+                if optimized_bytes < original_bytes or max(optimized_size) != max(result['optimized_size']):
+                    os.replace(tmp_file, target)
+                    result.update(
+                        path=str(target),
+                        optimized_bytes=optimized_bytes,
+                        optimized_size=list(optimized_size)
+                    )
+            finally:
+                tmp_file.unlink(missing_ok=True)
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+def optimize_images(image_files, max_dimension=None, lossy=False, quality=85, workers=None):
+    """Optimize images in a process pool, returning results in input order"""
+    image_files = list(image_files)
+    if not image_files:
+        return []
+
+    options = {'max_dimension': max_dimension, 'lossy': lossy, 'quality': quality}
+    if len(image_files) == 1 or workers == 1:
+        return [optimize_image(image_file, **options) for image_file in image_files]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(optimize_image, image_file, **options) for image_file in image_files]
+        return [future.result() for future in futures]
@@ -11,5 +11,8 @@ def get_paths():
         'images': images_dir,
         'pending': images_dir / 'pending',
         'uploaded': images_dir / 'uploaded',
-        'static': root_dir / 'meme' / 'static'
+        'static': root_dir / 'meme' / 'static',
+        'profiles': root_dir / '_profiles',
+        'cache': root_dir / '_cache',
+        'jobs': root_dir / '_jobs'
     } 
\ No newline at end of file
@@ -0,0 +1,212 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import uuid
+
+from contextlib import contextmanager, nullcontext
+
+from flask import g, has_request_context, request
+
+from .paths import get_paths
+
+PROFILE_HEADER = 'X-Meme-Profile'
+
+_NULL_PHASE = nullcontext()
+_enabled = False
+_settings = {
+    'profile_all': False,
+    'token': None,
+    'slow_ms': 0.0,
+    'max_files': 200
+}
+
+def init_profiling(app):
+    """Register profiling hooks on the app when profiling or slow-request sampling is configured
+
+    Reads MEME_PROFILE, MEME_PROFILE_TOKEN, MEME_SLOW_REQUEST_MS and MEME_PROFILE_MAX_FILES.
+    When none of them are set no hooks are installed and `phase` stays a no-op.
+    """
+    global _enabled
+
+    _settings.update(
+        profile_all=os.getenv('MEME_PROFILE', '').lower() in ('1', 'true', 'yes'),
+        token=os.getenv('MEME_PROFILE_TOKEN') or None,
+        slow_ms=float(os.getenv('MEME_SLOW_REQUEST_MS', 0)),
+        max_files=int(os.getenv('MEME_PROFILE_MAX_FILES', 200))
+    )
+
+    if not (_settings['profile_all'] or _settings['token'] or _settings['slow_ms'] > 0):
+        return False
+
+    _enabled = True
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_discard_request)
+    return True
+
+def phase(name):
+    """Time a block as a named phase of the current request (no-op when profiling is off)"""
+    if not _enabled or not has_request_context():
+        return _NULL_PHASE
+
+    phases = g.get('_meme_phases')
+    if phases is None:
+        return _NULL_PHASE
+    return _timed_phase(phases, name)
+
+@contextmanager
+def _timed_phase(phases, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def _profile_requested():
+    """Check whether this request asked for (or is configured for) a full profile"""
+    if _settings['profile_all']:
+        return True
+
+    supplied = request.headers.get(PROFILE_HEADER)
+    token = _settings['token']
+    return bool(token and supplied and hmac.compare_digest(supplied, token))
+
+def _isolated_profiling():
+    """Whether cProfile sees only this request's calls
+
+    From Python 3.12 cProfile records every thread in the interpreter, so in a
+    multithreaded worker a full profile would mix in other requests. Those
+    requests get phase timings only.
+    """
+    return sys.version_info < (3, 12) or not request.environ.get('wsgi.multithread', False)
+
+def _start_request():
+    g._meme_phases = {}
+    g._meme_profiler = None
+    g._meme_profile_requested = _profile_requested()
+
+    if g._meme_profile_requested and _isolated_profiling():
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g._meme_profiler = profiler
+        except ValueError:
+            # Another thread already holds the interpreter profiler; fall back to phase timings
+            pass
+
+    g._meme_started = time.perf_counter()
+
+def _finish_request(response):
+    started = g.pop('_meme_started', None)
+    if started is None:
+        return response
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    profiler = g.pop('_meme_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    phases = g.pop('_meme_phases', {})
+    requested = g.pop('_meme_profile_requested', False)
+
+    slow = _settings['slow_ms'] > 0 and elapsed_ms >= _settings['slow_ms']
+    if not requested and not slow:
+        return response
+
+    record = {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': response.status_code,
+        'total_ms': round(elapsed_ms, 3),
+        'phases': {name: round(ms, 3) for name, ms in phases.items()},
+        'slow': slow,
+        'profiled': profiler is not None
+    }
+    if profiler is not None:
+        record['stats'] = _format_stats(profiler)
+
+    try:
+        profile_id = save_profile(record)
+    except OSError as e:
+        print(f"Warning: Could not save request profile: {str(e)}")
+        profile_id = None
+
+    if requested:
+        timings = [f"{name};dur={ms:.1f}" for name, ms in phases.items()]
+        timings.append(f"total;dur={elapsed_ms:.1f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        if profile_id:
+            response.headers['X-Meme-Profile-Id'] = profile_id
+
+    return response
+
+def _discard_request(exc):
+    """Make sure a profiler left running by an unhandled error is switched off"""
+    profiler = g.pop('_meme_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+def _format_stats(profiler, limit=30):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+def save_profile(record):
+    """Write a profile record to the on-disk store, rotating out the oldest ones"""
+    profiles_dir = get_paths()['profiles']
+    profiles_dir.mkdir(parents=True, exist_ok=True)
+
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    record = {'id': profile_id, 'timestamp': time.time(), **record}
+
+    tmp_file = profiles_dir / f".{profile_id}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(record, f, indent=4)
+    os.replace(tmp_file, profiles_dir / f"{profile_id}.json")
+
+    stored = sorted(profiles_dir.glob('*.json'))
+    for old_file in stored[:max(len(stored) - _settings['max_files'], 0)]:
+        old_file.unlink(missing_ok=True)
+
+    return profile_id
+
+def list_profiles(limit=None):
+    """List stored profile records, newest first"""
+    profiles_dir = get_paths()['profiles']
+    if not profiles_dir.exists():
+        return []
+
+    records = []
+    for profile_file in sorted(profiles_dir.glob('*.json'), reverse=True)[:limit]:
+        try:
+            with open(profile_file, 'r') as f:
+                records.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return records
+
+def load_profile(profile_id):
+    """Load a single stored profile record by id"""
+    profile_file = get_paths()['profiles'] / f"{profile_id}.json"
+    if not profile_file.exists():
+        return None
+
+    with open(profile_file, 'r') as f:
+        return json.load(f)
+
+def clear_profiles():
+    """Delete all stored profile records"""
+    profiles_dir = get_paths()['profiles']
+    if not profiles_dir.exists():
+        return 0
+
+    count = 0
+    for profile_file in profiles_dir.glob('*.json'):
+        profile_file.unlink(missing_ok=True)
+        count += 1
+    return count